@@ -12,11 +12,23 @@ respetando el mismo patrón normalizado del proyecto WeatherStack:
 Ejecuta este script una sola vez después de generar el CSV:
 
     python scripts/cargar_postgres.py
+    python scripts/cargar_postgres.py data/masivo/*.csv    # shards del modo masivo
+
+Los registros se cargan con ``COPY ... FROM STDIN`` en bloques de
+``CARGA_BLOQUE_MB`` MB: el CSV se lee por partes con pyarrow, el nombre de la
+institución se reemplaza por su id y el bloque se envía tal cual a PostgreSQL. Los índices
+secundarios y la llave foránea se crean después de la carga, en una sola pasada.
 """
 
+import io
 import os
 import sys
+import time
+import argparse
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
 from sqlalchemy import text
 
 # Permite importar database.py al ejecutar este archivo directamente
@@ -26,6 +38,12 @@ from database import engine
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CSV_PATH = os.path.join(BASE_DIR, "data", "educacion.csv")
 
+# Tamaño (MB de CSV) de cada bloque enviado con COPY
+BLOQUE_CARGA_MB = int(os.getenv("CARGA_BLOQUE_MB", "32"))
+
+COLUMNAS_COPY = ["institucion_id", "nombre", "hours", "sleep",
+                 "attendance", "screen", "grade", "fecha_registro"]
+
 DDL = """
 DROP TABLE IF EXISTS registros_estudiantes CASCADE;
 DROP TABLE IF EXISTS instituciones        CASCADE;
@@ -37,7 +55,7 @@ CREATE TABLE instituciones (
 
 CREATE TABLE registros_estudiantes (
     id              SERIAL PRIMARY KEY,
-    institucion_id  INTEGER NOT NULL REFERENCES instituciones(id) ON DELETE CASCADE,
+    institucion_id  INTEGER NOT NULL,
     nombre          VARCHAR(60),
     hours           NUMERIC(4, 1) NOT NULL,
     sleep           NUMERIC(4, 1) NOT NULL,
@@ -46,63 +64,131 @@ CREATE TABLE registros_estudiantes (
     grade           NUMERIC(4, 2) NOT NULL,
     fecha_registro  TIMESTAMP     NOT NULL
 );
+"""
+
+# Se crean después de la carga: construir un índice una vez es mucho más
+# barato que mantenerlo fila a fila durante el COPY
+INDICES = """
+ALTER TABLE registros_estudiantes
+    ADD CONSTRAINT registros_estudiantes_institucion_id_fkey
+    FOREIGN KEY (institucion_id) REFERENCES instituciones(id) ON DELETE CASCADE;
 
 CREATE INDEX idx_registros_institucion ON registros_estudiantes(institucion_id);
 CREATE INDEX idx_registros_fecha       ON registros_estudiantes(fecha_registro);
+
+ANALYZE instituciones;
+ANALYZE registros_estudiantes;
 """
 
 
-def crear_esquema():
-    """Crea las tablas (limpia si existen)."""
+def _ejecutar_sql(script):
     with engine.begin() as conn:
         # Ejecutar cada statement por separado para mayor compatibilidad
-        for stmt in [s.strip() for s in DDL.split(";") if s.strip()]:
+        for stmt in [s.strip() for s in script.split(";") if s.strip()]:
             conn.execute(text(stmt))
+
+
+def crear_esquema():
+    """Crea las tablas (limpia si existen), sin índices secundarios."""
+    _ejecutar_sql(DDL)
     print("Esquema creado: instituciones, registros_estudiantes")
 
 
-def cargar_csv(path=CSV_PATH):
-    if not os.path.exists(path):
-        raise FileNotFoundError(
-            f"No existe {path}. Ejecuta primero: python scripts/generador_datos.py"
-        )
+def crear_indices():
+    """Llave foránea, índices secundarios y estadísticas, tras la carga."""
+    inicio = time.perf_counter()
+    _ejecutar_sql(INDICES)
+    print(f"   -> indices creados ({time.perf_counter() - inicio:.1f}s)")
 
-    df = pd.read_csv(path)
-    print(f"CSV leido: {len(df):,} filas")
 
-    # 1. Catálogo de instituciones
-    instituciones = pd.DataFrame({
-        "nombre": sorted(df["institucion"].unique())
-    })
-    instituciones.to_sql("instituciones", engine, if_exists="append", index=False)
+def _ids_instituciones(cur, mapping, nombres):
+    """Agrega a ``mapping`` las instituciones nuevas de ``nombres`` (insertándolas)."""
+    nuevas = sorted(set(nombres) - mapping.keys() - {None})
+    if not nuevas:
+        return
+    cur.execute(
+        "INSERT INTO instituciones (nombre) SELECT unnest(%s) ON CONFLICT (nombre) DO NOTHING",
+        (nuevas,),
+    )
+    cur.execute("SELECT nombre, id FROM instituciones WHERE nombre = ANY(%s)", (nuevas,))
+    mapping.update(cur.fetchall())
+
+
+def _leer_bloques(ruta, bloque_mb):
+    """Lector en streaming del CSV; todas las columnas como texto, sin convertir.
+
+    Las celdas vacías se leen como nulos y el COPY las carga como NULL, igual que
+    hacía ``pd.read_csv``.
+    """
+    columnas = pd.read_csv(ruta, nrows=0).columns
+    return pa_csv.open_csv(
+        ruta,
+        read_options=pa_csv.ReadOptions(block_size=bloque_mb << 20),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={c: pa.string() for c in columnas},
+            null_values=[""],
+            strings_can_be_null=True,
+        ),
+    )
 
-    with engine.connect() as conn:
-        ids = pd.read_sql("SELECT id, nombre FROM instituciones", conn)
-    mapping = dict(zip(ids["nombre"], ids["id"]))
-    print(f"   -> {len(mapping)} instituciones insertadas")
 
-    # 2. Registros de estudiantes
-    registros = pd.DataFrame({
-        "institucion_id": df["institucion"].map(mapping),
-        "nombre":         df["nombre"],
-        "hours":          df["hours"],
-        "sleep":          df["sleep"],
-        "attendance":     df["attendance"],
-        "screen":         df["screen"],
-        "grade":          df["grade"],
-        "fecha_registro": pd.to_datetime(df["fecha_registro"]),
-    })
-
-    # Carga por chunks para tablas grandes
-    registros.to_sql(
-        "registros_estudiantes",
-        engine,
-        if_exists="append",
-        index=False,
-        chunksize=500,
-        method="multi",
+def cargar_csv(path=CSV_PATH, bloque_mb=BLOQUE_CARGA_MB):
+    """Carga uno o varios CSV con COPY, en bloques de ``bloque_mb`` MB.
+
+    Los valores se reenvían como texto sin pasar por objetos de Python:
+    PostgreSQL los interpreta al insertar. Todo ocurre en una transacción.
+    """
+    rutas = [path] if isinstance(path, (str, os.PathLike)) else list(path)
+    if not rutas:
+        raise ValueError("No se indicó ningún CSV para cargar")
+    for ruta in rutas:
+        if not os.path.exists(ruta):
+            raise FileNotFoundError(
+                f"No existe {ruta}. Ejecuta primero: python scripts/generador_datos.py"
+            )
+
+    sql_copy = (
+        f"COPY registros_estudiantes ({', '.join(COLUMNAS_COPY)}) "
+        "FROM STDIN WITH (FORMAT csv)"
     )
-    print(f"   -> {len(registros):,} registros_estudiantes insertados")
+    opciones_csv = pa_csv.WriteOptions(include_header=False)
+    mapping = {}
+    total = 0
+    inicio = time.perf_counter()
+
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        for ruta in rutas:
+            for lote in _leer_bloques(ruta, bloque_mb):
+                # 1. Catálogo de instituciones, a medida que aparecen
+                instituciones = lote.column("institucion")
+                _ids_instituciones(cur, mapping, pc.unique(instituciones).to_pylist())
+                posiciones = pc.index_in(instituciones, value_set=pa.array(list(mapping), pa.string()))
+                institucion_id = pc.take(pa.array(list(mapping.values()), pa.int32()), posiciones)
+
+                # 2. Registros de estudiantes: el bloque va directo al COPY
+                tabla = pa.Table.from_arrays(
+                    [institucion_id] + [lote.column(c) for c in COLUMNAS_COPY[1:]],
+                    names=COLUMNAS_COPY,
+                )
+                buffer = io.BytesIO()
+                pa_csv.write_csv(tabla, buffer, opciones_csv)
+                buffer.seek(0)
+                cur.copy_expert(sql_copy, buffer)
+                total += tabla.num_rows
+            print(f"   -> {os.path.basename(ruta)}: {total:,} filas acumuladas")
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+    segundos = time.perf_counter() - inicio
+    print(f"   -> {len(mapping)} instituciones insertadas")
+    print(f"   -> {total:,} registros_estudiantes insertados "
+          f"({segundos:.1f}s, {total / max(segundos, 1e-9):,.0f} filas/s)")
 
 
 def verificar():
@@ -127,9 +213,17 @@ def verificar():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga el dataset educacion en PostgreSQL")
+    parser.add_argument("csv", nargs="*", default=[CSV_PATH],
+                        help="CSV a cargar (por defecto data/educacion.csv)")
+    parser.add_argument("--bloque-mb", type=int, default=BLOQUE_CARGA_MB,
+                        help="MB de CSV por bloque enviado con COPY")
+    args = parser.parse_args()
+
     print("Cargando dataset educacion -> PostgreSQL")
     print("=" * 55)
     crear_esquema()
-    cargar_csv()
+    cargar_csv(args.csv, args.bloque_mb)
+    crear_indices()
     verificar()
     print("\nCarga completada")
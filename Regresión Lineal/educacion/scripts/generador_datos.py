@@ -17,8 +17,17 @@ similares a las descritas en education-regression.jsx:
 
 import os
 import csv
-from datetime import datetime, timedelta
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # solo se necesita para --formato parquet
+    pa = pq = None
 
 # ── Configuración ──────────────────────────────────────────────
 N_REGISTROS = 2000
@@ -56,10 +65,24 @@ NOMBRES = [
 ]
 
 
-def generar_registros(n=N_REGISTROS, seed=SEED):
-    """Construye registros usando dos factores latentes + ruido."""
-    rng = np.random.default_rng(seed)
+COLUMNAS = ["id", "nombre", "institucion", "hours", "sleep",
+            "attendance", "screen", "grade", "fecha_registro"]
+
+# Fechas distribuidas en el último año
+FECHA_BASE = np.datetime64("2025-04-15T08:00:00", "s")
+MINUTOS_ANO = 365 * 24 * 60
+
+# Generación masiva (--filas): filas por bloque en memoria
+BLOQUE = 1_000_000
+
 
+def generar_columnas(rng, n, id_inicial=1):
+    """Genera ``n`` registros como columnas NumPy a partir de dos factores latentes + ruido.
+
+    Todo está vectorizado (redondeo, fechas, nombres e instituciones por índice),
+    así el costo por fila no depende de Python. Los números aleatorios se piden
+    siempre en el mismo orden, de modo que una semilla produce los mismos datos.
+    """
     # Factores latentes (estandarizados)
     motivacion = rng.normal(0, 1, n)   # estudia más, atiende más, usa menos pantalla
     habilidad  = rng.normal(0, 1, n)   # mejora la nota independiente del esfuerzo
@@ -79,8 +102,8 @@ def generar_registros(n=N_REGISTROS, seed=SEED):
 
     # ── Variable objetivo (grade) ──────────────────────────────
     # Combinación lineal + efecto institución + ruido.
-    instituciones = rng.choice(INSTITUCIONES, n)
-    efecto_inst   = np.array([EFECTO_INSTITUCION[i] for i in instituciones])
+    idx_inst    = rng.choice(len(INSTITUCIONES), n)
+    efecto_inst = np.array([EFECTO_INSTITUCION[i] for i in INSTITUCIONES])[idx_inst]
 
     grade_raw = (
         0.90
@@ -93,27 +116,30 @@ def generar_registros(n=N_REGISTROS, seed=SEED):
     )
     grade = np.clip(grade_raw, 1.0, 5.0)
 
-    # Fechas distribuidas en el último año
-    base = datetime(2025, 4, 15, 8, 0, 0)
-    deltas = rng.integers(0, 365 * 24 * 60, n)
-    fechas = [base + timedelta(minutes=int(d)) for d in deltas]
-
-    nombres = rng.choice(NOMBRES, n)
-
-    registros = []
-    for i in range(n):
-        registros.append({
-            "id":               i + 1,
-            "nombre":           nombres[i],
-            "institucion":      instituciones[i],
-            "hours":            round(float(hours[i]), 1),
-            "sleep":            round(float(sleep[i]), 1),
-            "attendance":       int(round(float(attendance[i]))),
-            "screen":           round(float(screen[i]), 1),
-            "grade":            round(float(grade[i]), 2),
-            "fecha_registro":   fechas[i].isoformat(timespec="seconds"),
-        })
-    return registros
+    deltas = rng.integers(0, MINUTOS_ANO, n)
+    fechas = FECHA_BASE + deltas.astype("timedelta64[m]")
+
+    idx_nombre = rng.choice(len(NOMBRES), n)
+
+    return {
+        "id":             np.arange(id_inicial, id_inicial + n, dtype=np.int64),
+        "nombre":         np.array(NOMBRES, dtype=object)[idx_nombre],
+        "institucion":    np.array(INSTITUCIONES, dtype=object)[idx_inst],
+        "hours":          np.round(hours, 1),
+        "sleep":          np.round(sleep, 1),
+        "attendance":     np.rint(attendance).astype(np.int16),
+        "screen":         np.round(screen, 1),
+        "grade":          np.round(grade, 2),
+        "fecha_registro": fechas,
+    }
+
+
+def generar_registros(n=N_REGISTROS, seed=SEED):
+    """Construye registros usando dos factores latentes + ruido."""
+    columnas = generar_columnas(np.random.default_rng(seed), n)
+    columnas["fecha_registro"] = np.datetime_as_string(columnas["fecha_registro"], unit="s")
+    columnas = {c: v.tolist() for c, v in columnas.items()}
+    return [dict(zip(COLUMNAS, fila)) for fila in zip(*(columnas[c] for c in COLUMNAS))]
 
 
 def guardar_csv(registros, path=CSV_PATH):
@@ -125,6 +151,66 @@ def guardar_csv(registros, path=CSV_PATH):
     return path
 
 
+def _escribir_shard(ruta, filas, id_inicial, semilla, formato, bloque):
+    """Escribe un shard de ``filas`` registros bloque a bloque (memoria constante)."""
+    rng = np.random.default_rng(semilla)
+    temporal = ruta + ".tmp"
+    escritor = None
+    try:
+        for inicio in range(0, filas, bloque):
+            n = min(bloque, filas - inicio)
+            df = pd.DataFrame(generar_columnas(rng, n, id_inicial + inicio), columns=COLUMNAS)
+            if formato == "parquet":
+                tabla = pa.Table.from_pandas(df, preserve_index=False)
+                if escritor is None:
+                    escritor = pq.ParquetWriter(temporal, tabla.schema, compression="zstd")
+                escritor.write_table(tabla)
+            else:
+                df.to_csv(temporal, mode="w" if inicio == 0 else "a", header=inicio == 0,
+                          index=False, date_format="%Y-%m-%dT%H:%M:%S")
+        if escritor is not None:
+            escritor.close()
+    except BaseException:
+        # Un shard a medias no debe quedar en disco: se descarta el temporal
+        if escritor is not None:
+            escritor.close()
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    os.replace(temporal, ruta)
+    return ruta
+
+
+def generar_shards(filas, shards, salida_dir=DATA_DIR, formato="csv", bloque=BLOQUE,
+                   workers=None, seed=SEED):
+    """Genera ``filas`` registros repartidos en ``shards`` archivos, en procesos paralelos.
+
+    Cada shard recibe su propia semilla derivada de ``seed`` (``SeedSequence.spawn``),
+    así el resultado es reproducible sin importar cuántos procesos lo generen
+    (para los mismos ``filas``, ``shards`` y ``bloque``).
+    Devuelve la lista de rutas escritas.
+    """
+    if formato not in ("csv", "parquet"):
+        raise ValueError(f"Formato no soportado: {formato}")
+    if formato == "parquet" and pa is None:
+        raise ImportError("El formato parquet requiere pyarrow (pip install pyarrow)")
+    shards = max(1, min(shards, filas))
+    os.makedirs(salida_dir, exist_ok=True)
+
+    semillas = np.random.SeedSequence(seed).spawn(shards)
+    base, resto = divmod(filas, shards)
+    tareas, id_inicial = [], 1
+    for k in range(shards):
+        n = base + (1 if k < resto else 0)
+        ruta = os.path.join(salida_dir, f"educacion-{k:05d}.{formato}")
+        tareas.append((ruta, n, id_inicial, semillas[k], formato, bloque))
+        id_inicial += n
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futuros = [executor.submit(_escribir_shard, *tarea) for tarea in tareas]
+        return [futuro.result() for futuro in futuros]
+
+
 def reporte(registros):
     arr = np.array([
         [r["hours"], r["sleep"], r["attendance"], r["screen"], r["grade"]]
@@ -145,9 +231,33 @@ def reporte(registros):
 
 
 if __name__ == "__main__":
-    print(f"Generando {N_REGISTROS:,} registros sinteticos...")
-    registros = generar_registros()
-    path = guardar_csv(registros)
-    print(f"CSV guardado en: {path}")
-    print(f"Filas: {len(registros):,}")
-    reporte(registros)
+    parser = argparse.ArgumentParser(description="Generador de dataset sintético de rendimiento académico")
+    parser.add_argument("--filas", type=int,
+                        help="Modo masivo: total de registros, escritos en shards en paralelo")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1,
+                        help="Archivos de salida en modo masivo")
+    parser.add_argument("--formato", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--bloque", type=int, default=BLOQUE,
+                        help="Registros por bloque en memoria en cada proceso")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Procesos en paralelo (por defecto, uno por núcleo)")
+    parser.add_argument("--salida", default=os.path.join(DATA_DIR, "masivo"),
+                        help="Directorio de los shards en modo masivo")
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+
+    if args.filas:
+        print(f"Generando {args.filas:,} registros en {args.shards} shards ({args.formato})...")
+        inicio = time.perf_counter()
+        rutas = generar_shards(args.filas, args.shards, args.salida, args.formato,
+                               args.bloque, args.workers, args.seed)
+        segundos = time.perf_counter() - inicio
+        print(f"{len(rutas)} archivos en {args.salida} "
+              f"({segundos:.1f}s, {args.filas / segundos:,.0f} filas/s)")
+    else:
+        print(f"Generando {N_REGISTROS:,} registros sinteticos...")
+        registros = generar_registros(seed=args.seed)
+        path = guardar_csv(registros)
+        print(f"CSV guardado en: {path}")
+        print(f"Filas: {len(registros):,}")
+        reporte(registros)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Caché local (SQLite) de las respuestas de Weatherstack por ciudad.
+
+Una respuesta se reutiliza mientras no supere ``CACHE_RESPUESTAS_TTL`` segundos
+y mientras no se espere una observación nueva: Weatherstack actualiza los datos
+``current`` cada ``CACHE_CADENCIA_OBSERVACION`` segundos aproximadamente, así que
+la respuesta caduca cuando su ``observation_time`` más esa cadencia queda en el
+pasado. Volver a ejecutar el ETL dentro de esa ventana no consume cuota.
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+import unicodedata
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_PATH = os.getenv('CACHE_RESPUESTAS_PATH', os.path.join(BASE_DIR, 'data', 'cache_respuestas.sqlite'))
+CACHE_TTL = int(os.getenv('CACHE_RESPUESTAS_TTL', '600'))
+CADENCIA_OBSERVACION = int(os.getenv('CACHE_CADENCIA_OBSERVACION', '900'))
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS respuestas (
+    consulta     TEXT PRIMARY KEY,
+    respuesta    TEXT NOT NULL,
+    guardada_en  REAL NOT NULL,
+    observacion  REAL
+);
+"""
+
+
+def normalizar_consulta(ciudad):
+    """Clave de caché: minúsculas, sin tildes y con espacios simples (``" Bogotá "`` -> ``"bogota"``)."""
+    texto = unicodedata.normalize('NFKD', ciudad.strip().casefold())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.split())
+
+
+class CacheRespuestas:
+    """Respuestas de la API por consulta normalizada, con contadores de aciertos y fallos."""
+
+    def __init__(self, ruta=CACHE_PATH, ttl=CACHE_TTL, cadencia=CADENCIA_OBSERVACION):
+        self.ruta = ruta
+        self.ttl = ttl
+        self.cadencia = cadencia
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with self._conectar() as conn:
+            conn.executescript(ESQUEMA)
+
+    @contextmanager
+    def _conectar(self):
+        """Conexión al SQLite: commit al salir y cierre garantizado."""
+        conn = sqlite3.connect(self.ruta, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _expira(self, guardada_en, observacion):
+        expira = guardada_en + self.ttl
+        # Si la API ya devolvió una observación vieja no se sabe cuándo llega la
+        # siguiente: solo aplica el TTL
+        if observacion is not None and observacion + self.cadencia > guardada_en:
+            expira = min(expira, observacion + self.cadencia)
+        return expira
+
+    def obtener(self, ciudad):
+        """Respuesta en caché para ``ciudad`` si sigue vigente, si no None."""
+        if self.ttl <= 0:
+            return None
+        with self._conectar() as conn:
+            fila = conn.execute(
+                "SELECT respuesta, guardada_en, observacion FROM respuestas WHERE consulta = ?",
+                (normalizar_consulta(ciudad),),
+            ).fetchone()
+        vigente = fila is not None and time.time() < self._expira(fila[1], fila[2])
+        with self._lock:
+            if vigente:
+                self.aciertos += 1
+            else:
+                self.fallos += 1
+        return json.loads(fila[0]) if vigente else None
+
+    def guardar(self, ciudad, respuesta, fecha_observacion=None):
+        """Guarda la respuesta de ``ciudad``; ``fecha_observacion`` es ISO 8601 (o None)."""
+        if self.ttl <= 0:
+            return
+        observacion = None
+        if fecha_observacion:
+            try:
+                observacion = datetime.fromisoformat(fecha_observacion).timestamp()
+            except ValueError:
+                pass
+        with self._conectar() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO respuestas VALUES (?, ?, ?, ?)",
+                (normalizar_consulta(ciudad), json.dumps(respuesta), time.time(), observacion),
+            )
+
+    def resumen(self):
+        """Contadores de la caché: ``{'aciertos', 'fallos', 'tasa_aciertos'}``."""
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / total, 3) if total else 0.0,
+            }
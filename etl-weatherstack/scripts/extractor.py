@@ -1,11 +1,19 @@
 #!/usr/bin/env python3
 import os
+import time
+import random
+import argparse
+import threading
 import requests
-import json
-import pandas as pd
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 import logging
+from historico import guardar_historico
+from cache_respuestas import CacheRespuestas
+from transformador import (ESQUEMA, procesar_lote, formatos_salida, escribir_instantanea,
+                           leer_instantanea, fusionar_instantanea)
 
 # Obtener el directorio base del proyecto (parent del directorio scripts)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -13,6 +21,10 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # Cargar variables de entorno
 load_dotenv()
 
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+# Formatos de la instantánea además de clima.parquet: feather, csv, json
+FORMATOS = formatos_salida(os.getenv('ETL_FORMATOS', 'csv'))
+
 # Crear directorio de logs si no existe
 log_dir = os.path.join(BASE_DIR, 'logs')
 os.makedirs(log_dir, exist_ok=True)
@@ -29,104 +41,221 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Respuestas HTTP que se reintentan
+CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
+# Errores de Weatherstack (HTTP 200 con {"error": {"code": ...}}) que se reintentan:
+# 429 too_many_requests y 615 request_failed
+ERRORES_API_REINTENTABLES = {429, 615}
+
+
+class LimitadorTasa:
+    """Token bucket: ``tasa`` peticiones por segundo con ráfagas de hasta ``capacidad``."""
+
+    def __init__(self, tasa, capacidad=1):
+        self.tasa = tasa
+        self.capacidad = max(capacidad, 1)
+        self.tokens = float(self.capacidad)
+        self.ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        if self.tasa <= 0:
+            return
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa)
+                self.ultimo = ahora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                espera = (1 - self.tokens) / self.tasa
+            time.sleep(espera)
+
+
 class WeatherstackExtractor:
-    def __init__(self):
+    def __init__(self, max_workers=None, peticiones_por_segundo=None):
         self.api_key = os.getenv('API_KEY')
         self.base_url = os.getenv('WEATHERSTACK_BASE_URL')
-        self.ciudades = os.getenv('CIUDADES').split(',')
+        self.ciudades = [c.strip() for c in os.getenv('CIUDADES', '').split(',') if c.strip()]
         
         if not self.api_key:
             raise ValueError("API_KEY no configurada en .env")
+
+        # Peticiones simultáneas y cuota del plan de Weatherstack
+        self.max_workers = max_workers or int(os.getenv('WEATHERSTACK_WORKERS', '8'))
+        if peticiones_por_segundo is None:
+            peticiones_por_segundo = float(os.getenv('WEATHERSTACK_RPS', '5'))
+        self.limitador = LimitadorTasa(peticiones_por_segundo,
+                                       int(os.getenv('WEATHERSTACK_RAFAGA', str(self.max_workers))))
+        self.reintentos = int(os.getenv('WEATHERSTACK_REINTENTOS', '3'))
+        self.backoff_base = float(os.getenv('WEATHERSTACK_BACKOFF_BASE', '0.5'))
+        self.backoff_max = float(os.getenv('WEATHERSTACK_BACKOFF_MAX', '20'))
+
+        # Una sola sesión con pool de conexiones compartida por todos los hilos
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Respuestas recientes por ciudad (CACHE_RESPUESTAS_TTL=0 la desactiva)
+        self.cache = CacheRespuestas()
+
+    def _espera_reintento(self, intento, retry_after=None):
+        """Segundos antes del reintento: ``Retry-After`` si viene, si no backoff exponencial con jitter."""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                try:
+                    fecha = parsedate_to_datetime(retry_after)
+                    return min(max(fecha.timestamp() - time.time(), 0), self.backoff_max)
+                except (TypeError, ValueError):
+                    pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** intento))
     
     def extraer_clima(self, ciudad):
-        """Extrae datos de clima para una ciudad específica"""
-        try:
-            url = f"{self.base_url}/current"
-            params = {
-                'access_key': self.api_key,
-                'query': ciudad.strip()
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
+        """Extrae datos de clima para una ciudad específica.
+
+        Reintenta timeouts, errores de conexión, 429/5xx y los errores transitorios
+        de la API con backoff exponencial y jitter, respetando el límite de tasa.
+        """
+        url = f"{self.base_url}/current"
+        params = {
+            'access_key': self.api_key,
+            'query': ciudad.strip()
+        }
+        intento = 0
+        while True:
+            self.limitador.esperar()
+            try:
+                response = self.session.get(url, params=params, timeout=10)
+                if response.status_code in CODIGOS_REINTENTABLES and intento < self.reintentos:
+                    espera = self._espera_reintento(intento, response.headers.get('Retry-After'))
+                    logger.warning(f"HTTP {response.status_code} para {ciudad}, "
+                                   f"reintento {intento + 1}/{self.reintentos} en {espera:.1f}s")
+                    time.sleep(espera)
+                    intento += 1
+                    continue
+                response.raise_for_status()
+                data = response.json()
+            except (requests.Timeout, requests.ConnectionError) as e:
+                if intento >= self.reintentos:
+                    logger.error(f"Error extrayendo datos para {ciudad}: {str(e)}")
+                    return None
+                espera = self._espera_reintento(intento)
+                logger.warning(f"Error de red para {ciudad}, "
+                               f"reintento {intento + 1}/{self.reintentos} en {espera:.1f}s: {e}")
+                time.sleep(espera)
+                intento += 1
+                continue
+            except Exception as e:
+                logger.error(f"Error extrayendo datos para {ciudad}: {str(e)}")
+                return None
+
             if 'error' in data:
-                logger.error(f"Error en API para {ciudad}: {data['error']['info']}")
+                codigo = data['error'].get('code')
+                if codigo in ERRORES_API_REINTENTABLES and intento < self.reintentos:
+                    espera = self._espera_reintento(intento)
+                    logger.warning(f"Error {codigo} de la API para {ciudad}, "
+                                   f"reintento {intento + 1}/{self.reintentos} en {espera:.1f}s")
+                    time.sleep(espera)
+                    intento += 1
+                    continue
+                logger.error(f"Error en API para {ciudad}: {data['error'].get('info')}")
                 return None
-            
+
             logger.info(f"Datos extraídos para {ciudad}")
             return data
-            
-        except Exception as e:
-            logger.error(f"Error extrayendo datos para {ciudad}: {str(e)}")
-            return None
-    
-    def procesar_respuesta(self, response_data):
-        """Procesa la respuesta JSON a formato estructurado"""
-        try:
-            current = response_data.get('current', {})
-            location = response_data.get('location', {})
-            
-            return {
-                'ciudad': location.get('name'),
-                'pais': location.get('country'),
-                'latitud': location.get('lat'),
-                'longitud': location.get('lon'),
-                'temperatura': current.get('temperature'),
-                'sensacion_termica': current.get('feelslike'),
-                'humedad': current.get('humidity'),
-                'velocidad_viento': current.get('wind_speed'),
-                'descripcion': current.get('weather_descriptions', ['N/A'])[0],
-                'fecha_extraccion': datetime.now().isoformat(),
-                'codigo_tiempo': current.get('weather_code')
-            }
-        except Exception as e:
-            logger.error(f"Error procesando respuesta: {str(e)}")
-            return None
     
+    def extraer_ciudades(self, ciudades):
+        """Extrae el clima de ``ciudades`` en paralelo y lo procesa como un lote.
+
+        Se consultan hasta ``WEATHERSTACK_WORKERS`` ciudades a la vez sobre la
+        sesión compartida. Devuelve una tabla pyarrow con ``ESQUEMA`` que
+        conserva el orden de ``ciudades``.
+        """
+        if not ciudades:
+            return ESQUEMA.empty_table()
+        inicio = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=max(min(self.max_workers, len(ciudades)), 1)) as executor:
+            consultas = [(ciudad, *r) for ciudad, r in zip(ciudades, executor.map(self._consultar, ciudades))
+                         if r[0]]
+
+        tabla = procesar_lote([response for _, response, _ in consultas])
+
+        # Solo las respuestas nuevas van a la caché, con su hora de observación ya calculada
+        observaciones = tabla.column('fecha_observacion').to_pylist()
+        for (ciudad, response, desde_cache), observacion in zip(consultas, observaciones):
+            if not desde_cache:
+                self.cache.guardar(ciudad, response, observacion)
+
+        cache = self.cache.resumen()
+        logger.info(f"Extracción completada: {tabla.num_rows}/{len(ciudades)} ciudades "
+                    f"en {time.monotonic() - inicio:.1f}s (caché: {cache['aciertos']} aciertos, "
+                    f"{cache['fallos']} fallos)")
+        return tabla
+
+    def _consultar(self, ciudad):
+        """Respuesta cruda de ``ciudad`` y si vino de la caché: ``(response, desde_cache)``."""
+        response = self.cache.obtener(ciudad)
+        if response is not None:
+            logger.info(f"Datos de {ciudad} servidos desde la caché")
+            return response, True
+        return self.extraer_clima(ciudad), False
+
     def ejecutar_extraccion(self):
         """Ejecuta la extracción para todas las ciudades"""
-        datos_extraidos = []
-        
-        logger.info(f"Iniciando extracción para {len(self.ciudades)} ciudades...")
-        
-        for ciudad in self.ciudades:
-            response = self.extraer_clima(ciudad)
-            if response:
-                datos_procesados = self.procesar_respuesta(response)
-                if datos_procesados:
-                    datos_extraidos.append(datos_procesados)
-        
-        return datos_extraidos
+        logger.info(f"Iniciando extracción para {len(self.ciudades)} ciudades "
+                    f"con {self.max_workers} hilos...")
+        return self.extraer_ciudades(self.ciudades)
+
+
+def guardar_resultados(tabla, fusionar=False):
+    """Guarda la instantánea (Parquet + ``ETL_FORMATOS``) y la agrega al histórico.
+
+    Con ``fusionar=True`` solo se reemplazan las ciudades presentes en ``tabla``
+    y se conservan las demás (modo programado, que consulta por ciudad).
+    Devuelve la tabla de la instantánea.
+    """
+    instantanea = fusionar_instantanea(leer_instantanea(DATA_DIR), tabla) if fusionar else tabla
+    escribir_instantanea(instantanea, DATA_DIR, FORMATOS)
+
+    # Histórico acumulado (Parquet particionado por fecha, sin duplicados)
+    guardar_historico(tabla)
+    return instantanea
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ETL de clima con Weatherstack")
+    parser.add_argument('--programado', action='store_true',
+                        help="Proceso continuo que consulta cada ciudad según su intervalo")
+    parser.add_argument('--intervalo', type=int, default=int(os.getenv('INTERVALO_POLL', '600')),
+                        help="Segundos entre consultas de cada ciudad en modo programado")
+    args = parser.parse_args()
+
     try:
         extractor = WeatherstackExtractor()
-        datos = extractor.ejecutar_extraccion()
-        
-        # Crear directorio de datos si no existe
-        data_dir = os.path.join(BASE_DIR, 'data')
-        os.makedirs(data_dir, exist_ok=True)
-        
-        # Guardar como JSON
-        json_path = os.path.join(data_dir, 'clima_raw.json')
-        with open(json_path, 'w') as f:
-            json.dump(datos, f, indent=2)
-        logger.info(f"Datos guardados en {json_path}")
-        
-        # Guardar como CSV
-        df = pd.DataFrame(datos)
-        csv_path = os.path.join(data_dir, 'clima.csv')
-        df.to_csv(csv_path, index=False)
-        logger.info(f"Datos guardados en {csv_path}")
-        
-        print("\n" + "="*50)
-        print("RESUMEN DE EXTRACCIÓN")
-        print("="*50)
-        print(df.to_string())
-        print("="*50)
+
+        if args.programado:
+            from programador import ProgramadorClima, intervalos_por_ciudad
+            intervalos = intervalos_por_ciudad(extractor.ciudades, args.intervalo,
+                                               os.getenv('INTERVALOS_CIUDAD', ''))
+            ProgramadorClima(extractor, intervalos, guardar_resultados).ejecutar()
+        else:
+            datos = extractor.ejecutar_extraccion()
+            df = guardar_resultados(datos).to_pandas()
+
+            print("\n" + "="*50)
+            print("RESUMEN DE EXTRACCIÓN")
+            print("="*50)
+            print(df.to_string())
+            print("-"*50)
+            cache = extractor.cache.resumen()
+            print(f"Caché de respuestas: {cache['aciertos']} aciertos, {cache['fallos']} fallos "
+                  f"(tasa {cache['tasa_aciertos']:.0%})")
+            print("="*50)
         
     except Exception as e:
         logger.error(f"Error en extracción: {str(e)}")
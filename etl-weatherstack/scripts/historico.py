@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Histórico de observaciones de clima en Parquet, particionado por fecha.
+
+    data/historico/fecha=2026-02-14/part-<marca>.parquet
+
+Cada ejecución del extractor agrega un archivo por fecha con las observaciones
+nuevas. Cuando una partición acumula más de ``HISTORICO_MAX_PARTES`` archivos
+(el modo programado escribe uno por ronda) se compacta en uno solo, así el
+número de archivos por día y el costo de deduplicar se mantienen acotados.
+Una observación se identifica por (ciudad, fecha_observacion), así repetir una
+ejecución no duplica filas. Las consultas por rango de fechas solo leen las
+particiones que corresponden.
+"""
+import os
+import uuid
+import logging
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from transformador import ESQUEMA
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORICO_DIR = os.getenv('HISTORICO_DIR', os.path.join(BASE_DIR, 'data', 'historico'))
+# Archivos por partición a partir de los cuales se compacta en uno solo
+HISTORICO_MAX_PARTES = int(os.getenv('HISTORICO_MAX_PARTES', '8'))
+
+CLAVE = ['ciudad', 'fecha_observacion']
+PARTICIONADO = ds.partitioning(pa.schema([('fecha', pa.date32())]), flavor='hive')
+
+
+def _ruta_particion(directorio, fecha):
+    return os.path.join(directorio, f"fecha={fecha.isoformat()}")
+
+
+def _partes(ruta_particion):
+    """Archivos de datos de una partición (sin temporales)."""
+    return sorted(n for n in os.listdir(ruta_particion) if n.startswith('part-') and n.endswith('.parquet'))
+
+
+def _escribir_parte(ruta_particion, tabla, marca):
+    """Escribe ``tabla`` como un archivo nuevo de la partición y devuelve su nombre."""
+    nombre = f"part-{marca}-{uuid.uuid4().hex[:8]}.parquet"
+    # El prefijo "." hace que pyarrow ignore el temporal si la escritura se interrumpe
+    temporal = os.path.join(ruta_particion, f".{nombre}.tmp")
+    # Columnar con diccionario (ciudad, país, descripción se repiten) y zstd
+    pq.write_table(tabla, temporal, compression='zstd', use_dictionary=True)
+    os.replace(temporal, os.path.join(ruta_particion, nombre))
+    return nombre
+
+
+def compactar_particion(ruta_particion):
+    """Reescribe los archivos de una partición en uno solo, ordenado por hora y ciudad.
+
+    El archivo compacto se publica antes de borrar los anteriores: un lector
+    concurrente puede ver filas repetidas un instante, pero nunca pierde datos.
+    Devuelve el número de archivos reemplazados.
+    """
+    partes = _partes(ruta_particion)
+    if len(partes) <= 1:
+        return 0
+    tabla = ds.dataset([os.path.join(ruta_particion, p) for p in partes],
+                       format='parquet', schema=ESQUEMA).to_table()
+    tabla = tabla.sort_by([('fecha_observacion', 'ascending'), ('ciudad', 'ascending')])
+    _escribir_parte(ruta_particion, tabla, datetime.now().strftime('%Y%m%dT%H%M%S'))
+    for parte in partes:
+        os.remove(os.path.join(ruta_particion, parte))
+    logger.info(f"Histórico: {os.path.basename(ruta_particion)} compactada "
+                f"({len(partes)} archivos, {tabla.num_rows} filas)")
+    return len(partes)
+
+
+def _claves_existentes(ruta_particion):
+    """Claves (ciudad, fecha_observacion) ya guardadas en una partición."""
+    if not os.path.isdir(ruta_particion):
+        return set()
+    tabla = ds.dataset(ruta_particion, format='parquet').to_table(columns=CLAVE)
+    return set(zip(*(tabla.column(c).to_pylist() for c in CLAVE)))
+
+
+def guardar_historico(datos, directorio=HISTORICO_DIR):
+    """Agrega al histórico las observaciones de ``datos`` que aún no estén guardadas.
+
+    ``datos`` puede ser una tabla pyarrow con ``ESQUEMA`` o una lista de registros.
+    Devuelve el número de filas nuevas escritas.
+    """
+    df = datos.to_pandas() if isinstance(datos, pa.Table) else pd.DataFrame(datos)
+    if df.empty:
+        return 0
+    df = df.reindex(columns=ESQUEMA.names).dropna(subset=CLAVE).drop_duplicates(subset=CLAVE, keep='last')
+    # La API devuelve latitud/longitud como texto
+    for campo in ESQUEMA:
+        if pa.types.is_floating(campo.type) or pa.types.is_integer(campo.type):
+            df[campo.name] = pd.to_numeric(df[campo.name], errors='coerce')
+    fechas = pd.to_datetime(df['fecha_observacion']).dt.date
+
+    marca = datetime.now().strftime('%Y%m%dT%H%M%S')
+    nuevas = 0
+    for fecha, grupo in df.groupby(fechas):
+        ruta = _ruta_particion(directorio, fecha)
+        existentes = _claves_existentes(ruta)
+        grupo = grupo[[clave not in existentes for clave in zip(*(grupo[c] for c in CLAVE))]]
+        if grupo.empty:
+            continue
+        os.makedirs(ruta, exist_ok=True)
+        _escribir_parte(ruta, pa.Table.from_pandas(grupo, schema=ESQUEMA, preserve_index=False), marca)
+        nuevas += len(grupo)
+        if len(_partes(ruta)) > HISTORICO_MAX_PARTES:
+            compactar_particion(ruta)
+
+    logger.info(f"Histórico: {nuevas} observaciones nuevas, {len(df) - nuevas} ya existían")
+    return nuevas
+
+
+def leer_historico(desde=None, hasta=None, ciudades=None, columnas=None, directorio=HISTORICO_DIR):
+    """Observaciones entre ``desde`` y ``hasta`` (fechas inclusive) como DataFrame.
+
+    Los filtros por fecha se aplican sobre la partición, así solo se abren los
+    archivos de los días pedidos.
+    """
+    if not os.path.isdir(directorio):
+        return pd.DataFrame(columns=columnas)
+    dataset = ds.dataset(directorio, format='parquet', partitioning=PARTICIONADO,
+                         exclude_invalid_files=True)
+    filtro = None
+    condiciones = []
+    if desde is not None:
+        condiciones.append(ds.field('fecha') >= pd.Timestamp(desde).date())
+    if hasta is not None:
+        condiciones.append(ds.field('fecha') <= pd.Timestamp(hasta).date())
+    if ciudades:
+        condiciones.append(ds.field('ciudad').isin(list(ciudades)))
+    for condicion in condiciones:
+        filtro = condicion if filtro is None else filtro & condicion
+    return dataset.to_table(columns=columnas, filter=filtro).to_pandas()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Modo programado del ETL de clima: un proceso continuo que consulta cada ciudad
+según su intervalo, reutilizando la sesión HTTP, el limitador y el intérprete
+entre consultas (``python scripts/extractor.py --programado``).
+
+Los intervalos por ciudad se configuran con ``INTERVALOS_CIUDAD``:
+
+    INTERVALOS_CIUDAD=Neiva:300,Bogota:900
+
+Las ciudades sin intervalo propio usan ``INTERVALO_POLL``. SIGINT o SIGTERM
+terminan la ronda en curso (incluida la escritura de la instantánea) y luego
+detienen el proceso.
+"""
+import time
+import heapq
+import signal
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def intervalos_por_ciudad(ciudades, intervalo, especificacion=''):
+    """Segundos entre consultas de cada ciudad: ``{'Neiva': 300, ...}``."""
+    intervalos = {ciudad: intervalo for ciudad in ciudades}
+    for entrada in filter(None, (e.strip() for e in especificacion.split(','))):
+        ciudad, _, segundos = entrada.rpartition(':')
+        if not ciudad or not segundos.strip().isdigit():
+            raise ValueError(f"Intervalo inválido en INTERVALOS_CIUDAD: {entrada!r} (formato ciudad:segundos)")
+        if ciudad.strip() not in intervalos:
+            logger.warning(f"INTERVALOS_CIUDAD incluye {ciudad.strip()}, que no está en CIUDADES")
+            continue
+        intervalos[ciudad.strip()] = int(segundos)
+    for ciudad, segundos in intervalos.items():
+        if segundos <= 0:
+            raise ValueError(f"El intervalo de {ciudad} debe ser mayor que cero")
+    return intervalos
+
+
+class ProgramadorClima:
+    """Agenda de consultas por ciudad sobre un ``WeatherstackExtractor`` ya inicializado.
+
+    En cada ronda se consultan juntas (en paralelo) todas las ciudades vencidas
+    y se llama a ``guardar(datos, fusionar=True)``, que actualiza solo esas
+    ciudades en la instantánea y agrega sus observaciones al histórico.
+    """
+
+    def __init__(self, extractor, intervalos, guardar):
+        self.extractor = extractor
+        self.intervalos = intervalos
+        self.guardar = guardar
+        self.detener = threading.Event()
+        self.rondas = 0
+
+    def _senal(self, signum, frame):
+        logger.info(f"Señal {signal.Signals(signum).name} recibida, deteniendo al terminar la ronda en curso...")
+        self.detener.set()
+
+    def ejecutar(self):
+        signal.signal(signal.SIGINT, self._senal)
+        signal.signal(signal.SIGTERM, self._senal)
+
+        ahora = time.monotonic()
+        agenda = [(ahora, ciudad) for ciudad in self.intervalos]
+        heapq.heapify(agenda)
+        logger.info(f"Modo programado: {len(agenda)} ciudades, intervalos de "
+                    f"{min(self.intervalos.values())}s a {max(self.intervalos.values())}s")
+
+        while agenda and not self.detener.is_set():
+            espera = agenda[0][0] - time.monotonic()
+            if espera > 0:
+                # wait() despierta de inmediato si llega una señal
+                self.detener.wait(espera)
+                continue
+
+            ahora = time.monotonic()
+            vencidas = []
+            while agenda and agenda[0][0] <= ahora:
+                vencidas.append(heapq.heappop(agenda))
+
+            self._ronda([ciudad for _, ciudad in vencidas])
+
+            fin = time.monotonic()
+            for programada, ciudad in vencidas:
+                # Se agenda desde la hora prevista (sin deriva); si la ronda se
+                # retrasó más de un intervalo, desde ahora
+                siguiente = programada + self.intervalos[ciudad]
+                if siguiente <= fin:
+                    siguiente = fin + self.intervalos[ciudad]
+                heapq.heappush(agenda, (siguiente, ciudad))
+
+        logger.info(f"Modo programado detenido tras {self.rondas} rondas")
+
+    def _ronda(self, ciudades):
+        self.rondas += 1
+        try:
+            datos = self.extractor.extraer_ciudades(ciudades)
+            if datos:
+                self.guardar(datos, fusionar=True)
+        except Exception as e:
+            # Un fallo en una ronda no detiene el proceso: las ciudades se reintentan en su próximo turno
+            logger.error(f"Error en la ronda {self.rondas} ({', '.join(ciudades)}): {str(e)}")
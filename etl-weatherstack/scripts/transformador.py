@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Transformación por lotes de las respuestas de Weatherstack.
+
+``procesar_lote`` convierte una lista de respuestas crudas en una tabla
+columnar tipada (``ESQUEMA``) con operaciones vectorizadas de pyarrow/pandas,
+sin construir un diccionario por ciudad. ``escribir_instantanea`` escribe esa
+tabla en una sola pasada: ``clima.parquet`` siempre y, según ``ETL_FORMATOS``,
+también ``clima.feather``, ``clima.csv`` y ``clima_raw.json``.
+"""
+import os
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+ESQUEMA = pa.schema([
+    ('ciudad', pa.string()),
+    ('pais', pa.string()),
+    ('latitud', pa.float64()),
+    ('longitud', pa.float64()),
+    ('temperatura', pa.float32()),
+    ('sensacion_termica', pa.float32()),
+    ('humedad', pa.float32()),
+    ('velocidad_viento', pa.float32()),
+    ('descripcion', pa.string()),
+    ('fecha_extraccion', pa.string()),
+    ('fecha_observacion', pa.string()),
+    ('codigo_tiempo', pa.int32()),
+])
+
+# columna -> (objeto de la respuesta, campo)
+CAMPOS = {
+    'ciudad': ('location', 'name'),
+    'pais': ('location', 'country'),
+    'latitud': ('location', 'lat'),
+    'longitud': ('location', 'lon'),
+    'temperatura': ('current', 'temperature'),
+    'sensacion_termica': ('current', 'feelslike'),
+    'humedad': ('current', 'humidity'),
+    'velocidad_viento': ('current', 'wind_speed'),
+    'codigo_tiempo': ('current', 'weather_code'),
+}
+
+# Formatos adicionales de la instantánea (Parquet se escribe siempre)
+FORMATOS_SALIDA = {'feather', 'csv', 'json'}
+
+
+def _campo(crudo, objeto, nombre):
+    """Columna ``objeto.nombre`` de la tabla cruda (nulos si ninguna respuesta la trae)."""
+    if objeto in crudo.column_names:
+        columna = crudo.column(objeto).combine_chunks()
+        if nombre in [f.name for f in columna.type]:
+            return pc.struct_field(columna, nombre)
+    return pa.nulls(crudo.num_rows)
+
+
+def _fechas_observacion(horas, ahora):
+    """Fecha y hora UTC de cada observación (la API solo envía la hora, p. ej. ``"03:15 PM"``)."""
+    horas = pd.Series(horas.to_pandas(), dtype='object')
+    fechas = pd.to_datetime(ahora.strftime('%Y-%m-%d ') + horas, format='%Y-%m-%d %I:%M %p',
+                            utc=True, errors='coerce')
+    # Una observación posterior a "ahora" es del día anterior (cruce de medianoche UTC)
+    fechas = fechas.mask(fechas > ahora + timedelta(minutes=5), fechas - timedelta(days=1))
+    fechas = fechas.fillna(pd.Timestamp(ahora))
+    return pa.array(fechas.dt.strftime('%Y-%m-%dT%H:%M:%S+00:00'), pa.string())
+
+
+def procesar_lote(respuestas):
+    """Convierte respuestas crudas de ``/current`` en una tabla pyarrow con ``ESQUEMA``."""
+    if not respuestas:
+        return ESQUEMA.empty_table()
+
+    # Conversión a columnas en C++: location y current quedan como structs
+    crudo = pa.Table.from_pylist([
+        {'location': r.get('location') or {}, 'current': r.get('current') or {}} for r in respuestas
+    ])
+    columnas = {
+        nombre: pc.cast(_campo(crudo, *origen), ESQUEMA.field(nombre).type)
+        for nombre, origen in CAMPOS.items()
+    }
+    descripciones = _campo(crudo, 'current', 'weather_descriptions')
+    if pa.types.is_list(descripciones.type):
+        # Primer elemento de cada lista; las listas vacías o nulas quedan en nulo
+        con_valor = pc.greater(pc.fill_null(pc.list_value_length(descripciones), 0), 0)
+        primeros = pc.list_flatten(pc.list_slice(descripciones, 0, 1))
+        descripciones = pc.replace_with_mask(pa.nulls(crudo.num_rows, primeros.type), con_valor, primeros)
+    columnas['descripcion'] = pc.fill_null(pc.cast(descripciones, pa.string()), 'N/A')
+
+    ahora = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    columnas['fecha_extraccion'] = pa.array([datetime.now().isoformat()] * crudo.num_rows, pa.string())
+    columnas['fecha_observacion'] = _fechas_observacion(
+        pc.cast(_campo(crudo, 'current', 'observation_time'), pa.string()), ahora)
+
+    return pa.table([columnas[campo.name] for campo in ESQUEMA], schema=ESQUEMA)
+
+
+def formatos_salida(especificacion):
+    """Formatos adicionales pedidos en ``ETL_FORMATOS`` (p. ej. ``"csv,feather"``)."""
+    formatos = {f.strip().lower() for f in especificacion.split(',') if f.strip()}
+    formatos.discard('parquet')
+    desconocidos = formatos - FORMATOS_SALIDA
+    if desconocidos:
+        raise ValueError(f"Formatos de salida no soportados: {', '.join(sorted(desconocidos))}")
+    return formatos
+
+
+def _reemplazar(ruta, escribir):
+    """Escribe en un temporal y lo renombra: los lectores nunca ven un archivo a medias."""
+    temporal = ruta + '.tmp'
+    escribir(temporal)
+    os.replace(temporal, ruta)
+    logger.info(f"Datos guardados en {ruta}")
+
+
+def escribir_instantanea(tabla, data_dir, formatos=()):
+    """Escribe la instantánea en Parquet y en los ``formatos`` adicionales."""
+    os.makedirs(data_dir, exist_ok=True)
+    _reemplazar(os.path.join(data_dir, 'clima.parquet'),
+                lambda ruta: pq.write_table(tabla, ruta, compression='zstd'))
+    if 'feather' in formatos:
+        _reemplazar(os.path.join(data_dir, 'clima.feather'),
+                    lambda ruta: feather.write_feather(tabla, ruta, compression='zstd'))
+    if 'csv' in formatos:
+        _reemplazar(os.path.join(data_dir, 'clima.csv'),
+                    lambda ruta: pa_csv.write_csv(tabla, ruta))
+    if 'json' in formatos:
+        def escribir_json(ruta):
+            with open(ruta, 'w') as f:
+                json.dump(tabla.to_pylist(), f, ensure_ascii=False)
+        _reemplazar(os.path.join(data_dir, 'clima_raw.json'), escribir_json)
+
+
+def leer_instantanea(data_dir):
+    """Última instantánea escrita (tabla vacía si aún no existe)."""
+    ruta = os.path.join(data_dir, 'clima.parquet')
+    if not os.path.exists(ruta):
+        return ESQUEMA.empty_table()
+    return pq.read_table(ruta, schema=ESQUEMA)
+
+
+def fusionar_instantanea(anterior, nueva):
+    """Reemplaza en ``anterior`` las ciudades presentes en ``nueva`` y conserva las demás."""
+    conservar = pc.invert(pc.is_in(anterior.column('ciudad'), value_set=nueva.column('ciudad').combine_chunks()))
+    return pa.concat_tables([anterior.filter(pc.fill_null(conservar, True)), nueva])
@@ -1,9 +1,27 @@
 #!/usr/bin/env python3
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
-import logging
+"""
+Gráficas de análisis del clima, sin interfaz: se dibujan con el backend Agg y
+se guardan en disco (PNG, SVG o PDF).
+
+    python scripts/visualizador.py                      # data/clima_analysis.png
+    python scripts/visualizador.py --dpi 150 --top 15
+    python scripts/visualizador.py --por-region pais --workers 4
+
+Con muchas ciudades las barras muestran solo las ``top`` ciudades de cada
+métrica y la comparación temperatura/sensación térmica pasa a ser un diagrama
+de dispersión con todas. ``renderizar_por_region`` genera un juego de gráficas
+por región en procesos paralelos.
+"""
 import os
+import re
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+import numpy as np
+import pandas as pd
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -13,52 +31,140 @@ logger = logging.getLogger(__name__)
 script_dir = os.path.dirname(os.path.abspath(__file__))
 data_dir = os.path.join(script_dir, '..', 'data')
 
-# Cargar datos
-df = pd.read_csv(os.path.join(data_dir, 'clima.csv'))
-
-# Graficos
-fig, axes = plt.subplots(2, 2, figsize=(15, 10))
-fig.suptitle('Análisis de Clima por Ciudades', fontsize=16, fontweight='bold')
-
-# Gráfica 1: Temperaturas
-ax1 = axes[0, 0]
-ax1.bar(df['ciudad'], df['temperatura'], color='#ff6b6b')
-ax1.set_title('Temperatura Actual (°C)')
-ax1.set_ylabel('Temperatura (°C)')
-ax1.tick_params(axis='x', rotation=45)
-ax1.grid(axis='y', alpha=0.3)
-
-# Gráfica 2: Humedad
-ax2 = axes[0, 1]
-ax2.bar(df['ciudad'], df['humedad'], color='#4ecdc4')
-ax2.set_title('Humedad Relativa (%)')
-ax2.set_ylabel('Humedad (%)')
-ax2.tick_params(axis='x', rotation=45)
-ax2.grid(axis='y', alpha=0.3)
-
-# Gráfica 3: Velocidad del Viento
-ax3 = axes[1, 0]
-ax3.scatter(df['ciudad'], df['velocidad_viento'], s=200, color='#95e1d3')
-ax3.set_title('Velocidad del Viento (km/h)')
-ax3.set_ylabel('Velocidad (km/h)')
-ax3.tick_params(axis='x', rotation=45)
-ax3.grid(alpha=0.3)
-
-# Gráfica 4: Sensación Térmica vs Temperatura
-ax4 = axes[1, 1]
-x = np.arange(len(df))
-width = 0.35
-ax4.bar(x - width/2, df['temperatura'], width, label='Temperatura', color='#ff6b6b')
-ax4.bar(x + width/2, df['sensacion_termica'], width, label='Sensación Térmica', color='#ffa07a')
-ax4.set_title('Temperatura vs Sensación Térmica')
-ax4.set_ylabel('Temperatura (°C)')
-ax4.set_xticks(x)
-ax4.set_xticklabels(df['ciudad'], rotation=45)
-ax4.legend()
-ax4.grid(axis='y', alpha=0.3)
-
-plt.tight_layout()
-output_path = os.path.join(data_dir, 'clima_analysis.png')
-plt.savefig(output_path, dpi=300, bbox_inches='tight')
-logger.info(f"✅ Gráficas guardadas en {output_path}")
-plt.show()
+FORMATOS = ('png', 'svg', 'pdf')
+DPI = int(os.getenv('VISUALIZADOR_DPI', '150'))
+TOP = int(os.getenv('VISUALIZADOR_TOP', '20'))
+
+
+def cargar_datos(directorio=data_dir):
+    """Última instantánea del ETL (``clima.parquet`` o, si no existe, ``clima.csv``)."""
+    parquet = os.path.join(directorio, 'clima.parquet')
+    if os.path.exists(parquet):
+        return pd.read_parquet(parquet)
+    return pd.read_csv(os.path.join(directorio, 'clima.csv'))
+
+
+def _top(df, columna, top):
+    """Las ``top`` ciudades con mayor ``columna`` (todas si son menos), de mayor a menor."""
+    datos = df.dropna(subset=[columna])
+    if len(datos) > top:
+        datos = datos.nlargest(top, columna)
+    return datos.sort_values(columna, ascending=False)
+
+
+def _titulo(base, mostradas, total):
+    return base if mostradas == total else f"{base} — top {mostradas} de {total}"
+
+
+def renderizar(df, destino, titulo='Análisis de Clima por Ciudades', dpi=DPI, formato=None, top=TOP):
+    """Dibuja las cuatro gráficas de ``df`` y las guarda en ``destino``. Devuelve la ruta."""
+    formato = formato or os.path.splitext(destino)[1].lstrip('.') or 'png'
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato} (usa {', '.join(FORMATOS)})")
+    total = len(df)
+
+    # Figure directa (sin pyplot): no hay estado global ni ventana que cerrar
+    fig = Figure(figsize=(15, 10))
+    axes = fig.subplots(2, 2)
+    fig.suptitle(titulo, fontsize=16, fontweight='bold')
+
+    # Gráfica 1: Temperaturas
+    ax1 = axes[0, 0]
+    datos = _top(df, 'temperatura', top)
+    ax1.bar(datos['ciudad'], datos['temperatura'], color='#ff6b6b')
+    ax1.set_title(_titulo('Temperatura Actual (°C)', len(datos), total))
+    ax1.set_ylabel('Temperatura (°C)')
+    ax1.tick_params(axis='x', rotation=45)
+    ax1.grid(axis='y', alpha=0.3)
+
+    # Gráfica 2: Humedad
+    ax2 = axes[0, 1]
+    datos = _top(df, 'humedad', top)
+    ax2.bar(datos['ciudad'], datos['humedad'], color='#4ecdc4')
+    ax2.set_title(_titulo('Humedad Relativa (%)', len(datos), total))
+    ax2.set_ylabel('Humedad (%)')
+    ax2.tick_params(axis='x', rotation=45)
+    ax2.grid(axis='y', alpha=0.3)
+
+    # Gráfica 3: Velocidad del Viento
+    ax3 = axes[1, 0]
+    datos = _top(df, 'velocidad_viento', top)
+    ax3.scatter(datos['ciudad'], datos['velocidad_viento'], s=200, color='#95e1d3')
+    ax3.set_title(_titulo('Velocidad del Viento (km/h)', len(datos), total))
+    ax3.set_ylabel('Velocidad (km/h)')
+    ax3.tick_params(axis='x', rotation=45)
+    ax3.grid(alpha=0.3)
+
+    # Gráfica 4: Sensación Térmica vs Temperatura
+    ax4 = axes[1, 1]
+    if total <= top:
+        x = np.arange(total)
+        width = 0.35
+        ax4.bar(x - width/2, df['temperatura'], width, label='Temperatura', color='#ff6b6b')
+        ax4.bar(x + width/2, df['sensacion_termica'], width, label='Sensación Térmica', color='#ffa07a')
+        ax4.set_xticks(x)
+        ax4.set_xticklabels(df['ciudad'], rotation=45)
+        ax4.set_ylabel('Temperatura (°C)')
+        ax4.legend()
+    else:
+        # Vista agregada: una barra por ciudad sería ilegible
+        ax4.scatter(df['temperatura'], df['sensacion_termica'], s=15, alpha=0.6, color='#ff6b6b')
+        limites = [np.nanmin(df[['temperatura', 'sensacion_termica']].to_numpy()),
+                   np.nanmax(df[['temperatura', 'sensacion_termica']].to_numpy())]
+        ax4.plot(limites, limites, linestyle='--', color='#999999', linewidth=1)
+        ax4.set_xlabel('Temperatura (°C)')
+        ax4.set_ylabel('Sensación Térmica (°C)')
+    ax4.set_title('Temperatura vs Sensación Térmica')
+    ax4.grid(axis='y', alpha=0.3)
+
+    fig.tight_layout()
+    os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+    fig.savefig(destino, dpi=dpi, format=formato, bbox_inches='tight')
+    logger.info(f"✅ Gráficas guardadas en {destino}")
+    return destino
+
+
+def _nombre_archivo(region):
+    return re.sub(r'[^\w-]+', '_', str(region)).strip('_') or 'sin_region'
+
+
+def renderizar_por_region(df, salida_dir, columna='pais', workers=None, formato='png', **opciones):
+    """Un juego de gráficas por valor de ``columna``, dibujados en procesos paralelos.
+
+    Devuelve ``{region: ruta}``.
+    """
+    grupos = {region: grupo for region, grupo in df.groupby(df[columna].fillna('Sin región'))}
+    if not grupos:
+        return {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futuros = {
+            region: executor.submit(
+                renderizar, grupo,
+                os.path.join(salida_dir, f"clima_analysis_{_nombre_archivo(region)}.{formato}"),
+                f"Análisis de Clima — {region}", formato=formato, **opciones,
+            )
+            for region, grupo in grupos.items()
+        }
+        return {region: futuro.result() for region, futuro in futuros.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gráficas de análisis del clima")
+    parser.add_argument('--dpi', type=int, default=DPI)
+    parser.add_argument('--formato', choices=FORMATOS, default='png')
+    parser.add_argument('--top', type=int, default=TOP,
+                        help="Ciudades por gráfica de barras cuando hay más")
+    parser.add_argument('--por-region', metavar='COLUMNA',
+                        help="Genera un juego de gráficas por valor de la columna (p. ej. pais)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Procesos en paralelo con --por-region")
+    args = parser.parse_args()
+
+    df = cargar_datos()
+    if args.por_region:
+        rutas = renderizar_por_region(df, data_dir, args.por_region, workers=args.workers,
+                                      formato=args.formato, dpi=args.dpi, top=args.top)
+        logger.info(f"{len(rutas)} juegos de gráficas generados por {args.por_region}")
+    else:
+        renderizar(df, os.path.join(data_dir, f'clima_analysis.{args.formato}'),
+                   dpi=args.dpi, formato=args.formato, top=args.top)
@@ -0,0 +1,171 @@
+import re
+from sqlalchemy import select, func, or_, text
+from db.database import sesion
+from db.models import Personaje, PalabraFrase, DOCUMENTO_PERSONAJE, DOCUMENTO_EPISODIO
+
+# Columnas por las que se puede ordenar la tabla de personajes
+COLUMNAS_ORDEN_PERSONAJES = ('id', 'name', 'gender', 'age', 'occupation', 'status')
+
+
+def _patron_ilike(texto):
+    """Patrón ``%texto%`` con los comodines de LIKE escapados."""
+    texto = texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{texto}%'
+
+
+# Columnas de un personaje que devuelven las consultas de la tabla y del detalle
+COLUMNAS_PERSONAJE = (
+    Personaje.id, Personaje.name, Personaje.age, Personaje.gender, Personaje.status,
+    Personaje.occupation, Personaje.birthdate, Personaje.portrait_path, Personaje.phrases,
+)
+
+
+def _filtro_personajes(texto):
+    """Condiciones para filtrar personajes por nombre u ocupación (``ILIKE``)."""
+    if not texto:
+        return []
+    patron = _patron_ilike(texto)
+    return [or_(
+        Personaje.name.ilike(patron, escape='\\'),
+        Personaje.occupation.ilike(patron, escape='\\'),
+    )]
+
+
+def buscar_personajes(texto='', orden='id', descendente=False, pagina=1, tamano=25):
+    """Página de personajes filtrada por nombre u ocupación.
+
+    El filtro (``ILIKE``, apoyado en índices trigram), el orden y la paginación
+    se resuelven en PostgreSQL, así solo se materializa la página visible.
+    Devuelve ``(filas, total)``: las filas de la página como diccionarios y el
+    total de coincidencias.
+    """
+    if orden not in COLUMNAS_ORDEN_PERSONAJES:
+        raise ValueError(f"Columna de orden no permitida: {orden}")
+
+    filtros = _filtro_personajes(texto)
+    columna = getattr(Personaje, orden)
+    criterio = columna.desc().nulls_last() if descendente else columna.asc().nulls_last()
+    consulta = (
+        select(*COLUMNAS_PERSONAJE)
+        .where(*filtros)
+        .order_by(criterio, Personaje.id)
+        .limit(tamano)
+        .offset((max(pagina, 1) - 1) * tamano)
+    )
+
+    with sesion() as db:
+        total = db.execute(select(func.count()).select_from(Personaje).where(*filtros)).scalar_one()
+        filas = [dict(fila) for fila in db.execute(consulta).mappings()]
+    return filas, total
+
+
+def nombres_personajes(texto=''):
+    """Id y nombre de todos los personajes que coinciden con ``texto``, por nombre.
+
+    Alimenta el selector de detalle, que debe alcanzar cualquier coincidencia y
+    no solo la página visible de la tabla.
+    """
+    consulta = (
+        select(Personaje.id, Personaje.name)
+        .where(Personaje.name.isnot(None), *_filtro_personajes(texto))
+        .order_by(Personaje.name, Personaje.id)
+    )
+    with sesion() as db:
+        return [dict(fila) for fila in db.execute(consulta).mappings()]
+
+
+def obtener_personaje(personaje_id):
+    """Un personaje como diccionario (None si no existe)."""
+    with sesion() as db:
+        fila = db.execute(select(*COLUMNAS_PERSONAJE).where(Personaje.id == personaje_id)).mappings().first()
+    return dict(fila) if fila else None
+
+
+def _tsquery_prefijos(texto):
+    """Convierte el texto del usuario en un tsquery de prefijos: ``homer simp`` -> ``homer:* & simp:*``."""
+    palabras = re.findall(r'[^\W_]+', texto.lower())
+    return ' & '.join(f'{p}:*' for p in palabras)
+
+
+def buscar_texto(texto, limite=10):
+    """Búsqueda de texto completo sobre personajes (nombre, ocupación, frases) y episodios.
+
+    Usa los índices GIN de ``DOCUMENTO_PERSONAJE``/``DOCUMENTO_EPISODIO`` y ordena
+    por ``ts_rank_cd``. Si ningún personaje coincide, recurre a similitud trigram
+    sobre el nombre para tolerar errores de escritura.
+    Devuelve ``{'personajes': [...], 'episodios': [...]}``.
+    """
+    consulta = _tsquery_prefijos(texto)
+    if not consulta:
+        return {'personajes': [], 'episodios': []}
+
+    parametros = {'consulta': consulta, 'texto': texto, 'limite': limite}
+    with sesion() as db:
+        personajes = db.execute(text(f"""
+            SELECT id, name, occupation, ts_rank_cd({DOCUMENTO_PERSONAJE}, q) AS rango
+            FROM personajes, to_tsquery('english', :consulta) AS q
+            WHERE {DOCUMENTO_PERSONAJE} @@ q
+            ORDER BY rango DESC, id
+            LIMIT :limite
+        """), parametros).mappings().all()
+
+        if not personajes:
+            personajes = db.execute(text("""
+                SELECT id, name, occupation, similarity(name, :texto) AS rango
+                FROM personajes
+                WHERE name % :texto
+                ORDER BY rango DESC, id
+                LIMIT :limite
+            """), parametros).mappings().all()
+
+        episodios = db.execute(text(f"""
+            SELECT id, name, season, episode_number, ts_rank_cd({DOCUMENTO_EPISODIO}, q) AS rango
+            FROM episodios, to_tsquery('english', :consulta) AS q
+            WHERE {DOCUMENTO_EPISODIO} @@ q
+            ORDER BY rango DESC, id
+            LIMIT :limite
+        """), parametros).mappings().all()
+
+    return {
+        'personajes': [dict(fila) for fila in personajes],
+        'episodios': [dict(fila) for fila in episodios],
+    }
+
+
+def palabras_personaje(personaje_id, limite=10):
+    """Palabras más usadas en las frases de un personaje: ``[{'token', 'cantidad'}]``."""
+    consulta = (
+        select(PalabraFrase.token, PalabraFrase.cantidad)
+        .where(PalabraFrase.personaje_id == personaje_id)
+        .order_by(PalabraFrase.cantidad.desc(), PalabraFrase.token)
+        .limit(limite)
+    )
+    with sesion() as db:
+        return [dict(fila) for fila in db.execute(consulta).mappings()]
+
+
+def palabras_corpus(limite=20):
+    """Palabras más usadas sumando las frases de todos los personajes."""
+    total = func.sum(PalabraFrase.cantidad).label('cantidad')
+    personajes = func.count(PalabraFrase.personaje_id).label('personajes')
+    consulta = (
+        select(PalabraFrase.token, total, personajes)
+        .group_by(PalabraFrase.token)
+        .order_by(total.desc(), PalabraFrase.token)
+        .limit(limite)
+    )
+    with sesion() as db:
+        return [dict(fila) for fila in db.execute(consulta).mappings()]
+
+
+def personajes_que_dicen(palabra, limite=20):
+    """Personajes que usan ``palabra`` en sus frases, de más a menos veces."""
+    consulta = (
+        select(Personaje.id, Personaje.name, PalabraFrase.cantidad)
+        .join(PalabraFrase, PalabraFrase.personaje_id == Personaje.id)
+        .where(PalabraFrase.token == palabra.lower())
+        .order_by(PalabraFrase.cantidad.desc(), Personaje.name)
+        .limit(limite)
+    )
+    with sesion() as db:
+        return [dict(fila) for fila in db.execute(consulta).mappings()]
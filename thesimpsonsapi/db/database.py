@@ -1,6 +1,9 @@
 import os
 import sys
-from sqlalchemy import create_engine
+import time
+import threading
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, exc, text
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
@@ -22,11 +25,123 @@ if not all([DB_NAME, DB_USER]):
 
 DATABASE_URL = f'postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
 
-engine = create_engine(DATABASE_URL)
+# Pool de conexiones (el extractor y Streamlit pueden ajustarlo con su propio .env)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+# Timeouts del lado del servidor en milisegundos (0 = sin límite)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))
+DB_IDLE_TIMEOUT_MS = int(os.getenv('DB_IDLE_TIMEOUT_MS', '0'))
+
+
+class _EstadisticasPool:
+    """Contadores de uso del pool para diagnosticar contención."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.conexiones_creadas = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.esperas = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.timeouts = 0
+
+    def registrar_espera(self, segundos, timeout=False):
+        with self._lock:
+            if timeout:
+                self.timeouts += 1
+                return
+            self.esperas += 1
+            self.espera_total += segundos
+            self.espera_max = max(self.espera_max, segundos)
+
+    def incrementar(self, contador):
+        with self._lock:
+            setattr(self, contador, getattr(self, contador) + 1)
+
+
+_estadisticas = _EstadisticasPool()
+
+
+_opciones_servidor = []
+if DB_STATEMENT_TIMEOUT_MS:
+    _opciones_servidor.append(f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}')
+if DB_IDLE_TIMEOUT_MS:
+    _opciones_servidor.append(f'-c idle_in_transaction_session_timeout={DB_IDLE_TIMEOUT_MS}')
+
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args={'options': ' '.join(_opciones_servidor)} if _opciones_servidor else {},
+)
+
+event.listen(engine, 'connect', lambda *args: _estadisticas.incrementar('conexiones_creadas'))
+event.listen(engine, 'checkout', lambda *args: _estadisticas.incrementar('checkouts'))
+event.listen(engine, 'checkin', lambda *args: _estadisticas.incrementar('checkins'))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def _medir_espera(obtener):
+    """Llama a ``obtener`` (que toma una conexión del pool) y registra cuánto tardó."""
+    inicio = time.perf_counter()
+    try:
+        resultado = obtener()
+    except exc.TimeoutError:
+        _estadisticas.registrar_espera(0.0, timeout=True)
+        raise
+    _estadisticas.registrar_espera(time.perf_counter() - inicio)
+    return resultado
+
+
+@contextmanager
+def sesion():
+    """Sesión de base de datos: commit al salir, rollback ante error y cierre garantizado."""
+    db = SessionLocal()
+    try:
+        # La conexión se toma al entrar para medir la espera del pool
+        _medir_espera(db.connection)
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+@contextmanager
+def conexion():
+    """Conexión Core del pool (para lecturas en streaming), con la espera medida."""
+    with _medir_espera(engine.connect) as conn:
+        yield conn
+
+
+def estadisticas_pool():
+    """Estado actual del pool y estadísticas acumuladas de checkout y espera."""
+    pool = engine.pool
+    esperas = _estadisticas.esperas
+    return {
+        'tamano': pool.size(),
+        'en_uso': pool.checkedout(),
+        'disponibles': pool.checkedin(),
+        'overflow': pool.overflow(),
+        'conexiones_creadas': _estadisticas.conexiones_creadas,
+        'checkouts': _estadisticas.checkouts,
+        'checkins': _estadisticas.checkins,
+        'timeouts': _estadisticas.timeouts,
+        'espera_media_ms': round(_estadisticas.espera_total / esperas * 1000, 2) if esperas else 0.0,
+        'espera_max_ms': round(_estadisticas.espera_max * 1000, 2),
+    }
+
+
 def get_db():
     """Generador de sesión de base de datos."""
     db = SessionLocal()
@@ -36,17 +151,40 @@ def get_db():
         db.close()
 
 
+def _crear_extensiones():
+    """Extensiones y funciones de PostgreSQL que necesitan los índices de los modelos."""
+    with engine.begin() as conn:
+        conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        # array_to_string no es IMMUTABLE y no puede usarse directo en un índice
+        conn.execute(text(
+            "CREATE OR REPLACE FUNCTION texto_arreglo(text[]) RETURNS text "
+            "LANGUAGE sql IMMUTABLE PARALLEL SAFE "
+            "AS $$ SELECT coalesce(array_to_string($1, ' '), '') $$"
+        ))
+
+
 def init_db():
     """Crea todas las tablas definidas en los modelos."""
     import db.models
+    _crear_extensiones()
     Base.metadata.create_all(bind=engine)
+    # create_all no agrega índices nuevos a tablas que ya existían
+    for tabla in Base.metadata.sorted_tables:
+        for indice in tabla.indexes:
+            indice.create(bind=engine, checkfirst=True)
+    from db.vistas import crear_vistas
+    crear_vistas()
 
 
 def reset_db():
     """Elimina y recrea todas las tablas (para migraciones de esquema)."""
     import db.models
+    from db.vistas import crear_vistas, eliminar_vistas
+    eliminar_vistas()
     Base.metadata.drop_all(bind=engine)
+    _crear_extensiones()
     Base.metadata.create_all(bind=engine)
+    crear_vistas()
 
 
 if __name__ == '__main__':
@@ -56,3 +194,4 @@ if __name__ == '__main__':
     logger.info("Creando tablas en la base de datos...")
     init_db()
     logger.info("Tablas creadas exitosamente.")
+    logger.info(f"Pool de conexiones: {estadisticas_pool()}")
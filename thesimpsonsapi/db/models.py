@@ -1,11 +1,32 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Index, ForeignKey, text
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.sql import func
 from db.base import Base
 
+# Documentos de búsqueda de texto completo. Las consultas de db/consultas.py usan
+# exactamente estas expresiones para que PostgreSQL aproveche los índices GIN.
+DOCUMENTO_PERSONAJE = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(occupation, '')), 'B') || "
+    "setweight(to_tsvector('english', texto_arreglo(phrases::text[])), 'C')"
+)
+DOCUMENTO_EPISODIO = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(synopsis, '')), 'B')"
+)
+
 
 class Personaje(Base):
     __tablename__ = 'personajes'
+    __table_args__ = (
+        # Búsqueda ILIKE '%texto%' por nombre u ocupación (requiere pg_trgm)
+        Index('ix_personajes_name_trgm', 'name',
+              postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        Index('ix_personajes_occupation_trgm', 'occupation',
+              postgresql_using='gin', postgresql_ops={'occupation': 'gin_trgm_ops'}),
+        # Texto completo sobre nombre, ocupación y frases
+        Index('ix_personajes_busqueda', text(DOCUMENTO_PERSONAJE), postgresql_using='gin'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=True)
@@ -24,6 +45,10 @@ class Personaje(Base):
 
 class Episodio(Base):
     __tablename__ = 'episodios'
+    __table_args__ = (
+        # Texto completo sobre nombre y sinopsis
+        Index('ix_episodios_busqueda', text(DOCUMENTO_EPISODIO), postgresql_using='gin'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=True)
@@ -50,3 +75,47 @@ class Ubicacion(Base):
 
     def __repr__(self):
         return f'<Ubicacion id={self.id} name={self.name!r}>'
+
+
+class PalabraFrase(Base):
+    """Frecuencia de cada palabra en las frases de un personaje (ver db/palabras.py)."""
+    __tablename__ = 'palabras_frases'
+    __table_args__ = (
+        # "¿Qué personajes dicen X?" y agregados por palabra en todo el corpus
+        Index('ix_palabras_frases_token', 'token'),
+    )
+
+    # La clave primaria (personaje_id, token) sirve de índice por personaje
+    personaje_id = Column(Integer, ForeignKey('personajes.id', ondelete='CASCADE'), primary_key=True)
+    token = Column(String, primary_key=True)
+    cantidad = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<PalabraFrase personaje_id={self.personaje_id} token={self.token!r} cantidad={self.cantidad}>'
+
+
+class EstadoSincronizacion(Base):
+    """Checkpoint de la sincronización incremental de un endpoint de la API."""
+    __tablename__ = 'estado_sincronizacion'
+
+    endpoint = Column(String, primary_key=True)
+    ultima_pagina = Column(Integer, nullable=False, default=0)
+    total_registros = Column(Integer, nullable=False, default=0)
+    hashes = Column(JSONB, nullable=False, default=dict)
+    completado = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f'<EstadoSincronizacion endpoint={self.endpoint!r} ultima_pagina={self.ultima_pagina}>'
+
+
+class VersionDatos(Base):
+    """Versión de los datos publicada por el extractor (fila única, ``id = 1``)."""
+    __tablename__ = 'version_datos'
+
+    id = Column(Integer, primary_key=True, default=1)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f'<VersionDatos version={self.version}>'
@@ -0,0 +1,50 @@
+"""
+Índice de frecuencia de palabras de las frases de cada personaje.
+
+La tokenización se hace en PostgreSQL (minúsculas, solo letras a-z, palabras
+de más de dos letras y sin stop words) y el resultado se guarda en
+``palabras_frases`` (personaje_id, token, cantidad).
+"""
+from sqlalchemy import text
+
+STOP_WORDS = sorted({
+    'the', 'a', 'an', 'is', 'are', 'was', 'were', 'be', 'been', 'being',
+    'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
+    'should', 'may', 'might', 'shall', 'can', 'need', 'dare', 'ought',
+    'i', 'me', 'my', 'you', 'your', 'he', 'him', 'his', 'she', 'her', 'it',
+    'its', 'we', 'our', 'they', 'them', 'their', 'what', 'which', 'who',
+    'this', 'that', 'these', 'those', 'am', 'to', 'of', 'in', 'for', 'on',
+    'with', 'at', 'by', 'from', 'as', 'into', 'about', 'like', 'after',
+    'between', 'out', 'against', 'during', 'without', 'before', 'above',
+    'below', 'up', 'down', 'and', 'but', 'or', 'nor', 'not', 'so', 'very',
+    'just', 'than', 'too', 'also', 'if', 'then', 'all', 'no', 'dont', 'im',
+    'oh', 'get', 'got', 'go', 'going', 'thats', 'youre', 'well', 'let',
+})
+
+_INSERTAR = r"""
+INSERT INTO palabras_frases (personaje_id, token, cantidad)
+SELECT p.id, t.token, COUNT(*)
+FROM personajes p
+CROSS JOIN LATERAL regexp_split_to_table(
+    regexp_replace(lower(array_to_string(p.phrases, ' ')), '[^a-z\s]', '', 'g'), '\s+'
+) AS t(token)
+WHERE {filtro} length(t.token) > 2 AND NOT (t.token = ANY(:stop_words))
+GROUP BY p.id, t.token
+"""
+
+
+def actualizar_palabras(db, ids=None):
+    """Recalcula el índice de palabras de los personajes ``ids`` (todos si es None).
+
+    ``db`` puede ser una sesión o una conexión; el llamador controla la transacción.
+    Devuelve el número de filas insertadas.
+    """
+    if ids is None:
+        db.execute(text("DELETE FROM palabras_frases"))
+        return db.execute(text(_INSERTAR.format(filtro='')), {'stop_words': STOP_WORDS}).rowcount
+    ids = list(ids)
+    if not ids:
+        return 0
+    db.execute(text("DELETE FROM palabras_frases WHERE personaje_id = ANY(:ids)"), {'ids': ids})
+    return db.execute(text(_INSERTAR.format(filtro='p.id = ANY(:ids) AND')),
+                      {'ids': ids, 'stop_words': STOP_WORDS}).rowcount
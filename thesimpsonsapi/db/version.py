@@ -0,0 +1,28 @@
+"""
+Versión de los datos cargados en PostgreSQL.
+
+El extractor la incrementa al final de cada ejecución que modificó filas y la
+app la usa como clave de sus cachés: mientras no cambie, los DataFrames
+cacheados se reutilizan sin volver a consultar las tablas.
+"""
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from db.database import sesion
+from db.models import VersionDatos
+
+
+def leer_version():
+    """Versión actual de los datos (0 si el extractor aún no publicó ninguna)."""
+    with sesion() as db:
+        return db.execute(select(VersionDatos.version).where(VersionDatos.id == 1)).scalar() or 0
+
+
+def incrementar_version():
+    """Publica una nueva versión de los datos y la devuelve."""
+    stmt = insert(VersionDatos).values(id=1, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['id'],
+        set_={'version': VersionDatos.version + 1, 'updated_at': func.now()},
+    ).returning(VersionDatos.version)
+    with sesion() as db:
+        return db.execute(stmt).scalar_one()
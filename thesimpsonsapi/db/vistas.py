@@ -0,0 +1,95 @@
+"""
+Vistas materializadas con los agregados que consumen los gráficos del dashboard.
+
+Se crean en ``init_db`` y el extractor las refresca al final de cada ejecución,
+de modo que la app lee cada gráfico con una consulta sobre unas pocas filas.
+"""
+from sqlalchemy import text
+from db.database import conexion, engine
+
+# nombre -> (consulta, columnas del índice único, orden de lectura)
+VISTAS = {
+    'resumen': (
+        """SELECT 1 AS id,
+                  (SELECT COUNT(*) FROM personajes) AS personajes,
+                  (SELECT COUNT(*) FROM episodios) AS episodios,
+                  (SELECT COUNT(*) FROM ubicaciones) AS ubicaciones,
+                  (SELECT COUNT(DISTINCT season) FROM episodios) AS temporadas,
+                  (SELECT COUNT(DISTINCT town) FROM ubicaciones) AS ciudades""",
+        'id', 'id',
+    ),
+    'genero': (
+        "SELECT gender AS genero, COUNT(*) AS cantidad FROM personajes "
+        "WHERE gender IS NOT NULL GROUP BY gender",
+        'genero', 'cantidad DESC, genero',
+    ),
+    'estado': (
+        "SELECT status AS estado, COUNT(*) AS cantidad FROM personajes "
+        "WHERE status IS NOT NULL GROUP BY status",
+        'estado', 'cantidad DESC, estado',
+    ),
+    'ocupacion': (
+        "SELECT occupation AS ocupacion, COUNT(*) AS cantidad FROM personajes "
+        "WHERE occupation IS NOT NULL GROUP BY occupation",
+        'ocupacion', 'cantidad DESC, ocupacion',
+    ),
+    'temporada': (
+        "SELECT season AS temporada, COUNT(*) AS episodios FROM episodios "
+        "WHERE season IS NOT NULL GROUP BY season",
+        'temporada', 'temporada',
+    ),
+    'ano': (
+        r"""SELECT substring(airdate FROM '^(\d{4})-\d{2}-\d{2}')::int AS ano, COUNT(*) AS episodios
+            FROM episodios
+            WHERE airdate ~ '^\d{4}-\d{2}-\d{2}'
+            GROUP BY 1""",
+        'ano', 'ano',
+    ),
+    'uso_ciudad': (
+        "SELECT use AS uso, town AS ciudad, COUNT(*) AS cantidad FROM ubicaciones "
+        "WHERE use IS NOT NULL AND town IS NOT NULL GROUP BY use, town",
+        'uso, ciudad', 'uso, ciudad',
+    ),
+    'ciudad': (
+        "SELECT town AS ciudad, COUNT(*) AS cantidad FROM ubicaciones "
+        "WHERE town IS NOT NULL GROUP BY town",
+        'ciudad', 'cantidad DESC, ciudad',
+    ),
+}
+
+
+def crear_vistas():
+    """Crea las vistas materializadas y sus índices únicos si no existen."""
+    with engine.begin() as conn:
+        for nombre, (consulta, unico, _) in VISTAS.items():
+            conn.execute(text(f"CREATE MATERIALIZED VIEW IF NOT EXISTS mv_{nombre} AS {consulta}"))
+            # El índice único permite REFRESH ... CONCURRENTLY
+            conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_{nombre} ON mv_{nombre} ({unico})"))
+
+
+def refrescar_vistas():
+    """Recalcula las vistas sin bloquear las lecturas de la app."""
+    with engine.begin() as conn:
+        for nombre in VISTAS:
+            conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY mv_{nombre}"))
+
+
+def eliminar_vistas():
+    """Elimina las vistas (necesario antes de borrar las tablas en ``reset_db``)."""
+    with engine.begin() as conn:
+        for nombre in VISTAS:
+            conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS mv_{nombre}"))
+
+
+def leer_vista(nombre):
+    """Columnas y filas de la vista ``nombre``: ``(columnas, filas)``, en su orden de lectura.
+
+    Las columnas salen del resultado, así están disponibles aunque la vista
+    esté vacía (recién creada o sin refrescar).
+    """
+    if nombre not in VISTAS:
+        raise ValueError(f"Vista de agregados desconocida: {nombre}")
+    _, _, orden = VISTAS[nombre]
+    with conexion() as conn:
+        resultado = conn.execute(text(f"SELECT * FROM mv_{nombre} ORDER BY {orden}"))
+        return list(resultado.keys()), [tuple(fila) for fila in resultado]
@@ -0,0 +1,372 @@
+import os
+import io
+import json
+import math
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, wait
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMAGE_BASE_URL = "https://cdn.thesimpsonsapi.com/500"
+
+# Lado mayor (px) de cada miniatura estándar
+TAMANOS = {
+    'pequena': 150,
+    'mediana': 300,
+    'grande': 500,
+}
+
+CACHE_DIR = os.getenv('IMAGENES_CACHE_DIR', os.path.join(BASE_DIR, 'data', 'imagenes'))
+CACHE_MAX_MB = int(os.getenv('IMAGENES_CACHE_MAX_MB', '200'))
+# Segundos durante los que una imagen se sirve sin revalidar con el CDN
+CACHE_TTL = int(os.getenv('IMAGENES_CACHE_TTL', str(7 * 24 * 3600)))
+# Descargas simultáneas al precargar varias imágenes
+PREFETCH_WORKERS = int(os.getenv('IMAGENES_PREFETCH_WORKERS', '8'))
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS imagenes (
+    url            TEXT PRIMARY KEY,
+    hash           TEXT NOT NULL,
+    etag           TEXT,
+    last_modified  TEXT,
+    bytes          INTEGER NOT NULL,
+    descargada_en  REAL NOT NULL,
+    ultimo_acceso  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_imagenes_hash ON imagenes(hash);
+CREATE INDEX IF NOT EXISTS idx_imagenes_acceso ON imagenes(ultimo_acceso);
+CREATE TABLE IF NOT EXISTS miniaturas (
+    hash    TEXT NOT NULL,
+    tamano  TEXT NOT NULL,
+    bytes   INTEGER NOT NULL,
+    PRIMARY KEY (hash, tamano)
+);
+-- Contenido listado en el manifiesto: nunca se desaloja ni cuenta para el máximo
+CREATE TABLE IF NOT EXISTS fijadas (
+    hash  TEXT PRIMARY KEY
+);
+"""
+
+# Bytes desalojables según el índice: cada original una vez (varias URLs pueden
+# compartir contenido) más sus miniaturas, sin el contenido fijado
+SQL_TAMANO_TOTAL = """
+SELECT (SELECT COALESCE(SUM(bytes), 0) FROM (
+            SELECT MAX(bytes) AS bytes FROM imagenes
+            WHERE hash NOT IN (SELECT hash FROM fijadas) GROUP BY hash))
+     + (SELECT COALESCE(SUM(bytes), 0) FROM miniaturas WHERE hash NOT IN (SELECT hash FROM fijadas))
+"""
+
+
+MANIFIESTO = 'manifiesto.json'
+
+
+def url_imagen(path):
+    """URL absoluta en el CDN para un ``portrait_path``/``image_path`` de la API."""
+    if path and path.startswith('/'):
+        return IMAGE_BASE_URL + path
+    return path
+
+
+class CacheImagenes:
+    """Caché en disco, direccionada por contenido, de las imágenes del CDN.
+
+    Cada imagen original se guarda una sola vez bajo el hash de su contenido y
+    se acompaña de miniaturas pre-redimensionadas (``TAMANOS``). Un índice SQLite
+    relaciona cada URL con su hash, su ``ETag`` y su último acceso; pasado el TTL
+    la imagen se revalida con ``If-None-Match`` y, si la caché supera el tamaño
+    máximo, se eliminan las imágenes usadas hace más tiempo (LRU).
+
+    El extractor puede precargar el catálogo completo (``precargar``), que deja
+    todas las miniaturas en disco y un ``manifiesto.json`` (URL -> miniaturas).
+    Las URLs presentes en el manifiesto se sirven directamente desde disco, sin
+    tocar el índice ni la red; el resto sigue el camino normal de la caché. Su
+    contenido queda fijado en el índice: una caché acotada sobre el mismo
+    directorio (la de la app) no lo desaloja ni lo cuenta para su máximo.
+    """
+
+    def __init__(self, directorio=CACHE_DIR, max_bytes=CACHE_MAX_MB * 1024 * 1024,
+                 ttl=CACHE_TTL, session=None):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=PREFETCH_WORKERS)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+        self._lock = threading.Lock()
+        self._manifiesto = {}
+        self._manifiesto_mtime = None
+        os.makedirs(os.path.join(directorio, 'originales'), exist_ok=True)
+        os.makedirs(os.path.join(directorio, 'miniaturas'), exist_ok=True)
+        with self._conectar() as conn:
+            conn.executescript(ESQUEMA)
+
+    @contextmanager
+    def _conectar(self):
+        """Conexión al índice SQLite: commit al salir y cierre garantizado."""
+        conn = sqlite3.connect(os.path.join(self.directorio, 'indice.sqlite'), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _ruta_original(self, hash_contenido):
+        return os.path.join(self.directorio, 'originales', hash_contenido)
+
+    def _ruta_miniatura(self, hash_contenido, tamano):
+        return os.path.join(self.directorio, 'miniaturas', f"{hash_contenido}_{tamano}.webp")
+
+    @staticmethod
+    def _escribir(ruta, contenido):
+        temporal = f"{ruta}.{threading.get_ident()}.tmp"
+        with open(temporal, 'wb') as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+
+    def ruta(self, url, tamano='mediana', timeout=10):
+        """Ruta local de la miniatura de ``url``, descargándola si hace falta (None si falla)."""
+        if tamano not in TAMANOS:
+            raise ValueError(f"Tamaño de miniatura no soportado: {tamano}")
+        url = url_imagen(url)
+        if not url:
+            return None
+        local = self._ruta_manifiesto(url, tamano)
+        if local:
+            return local
+        try:
+            return self._miniatura(self._resolver(url, timeout), tamano)
+        except Exception as e:
+            logger.warning(f"No se pudo obtener la imagen {url}: {e}")
+            return None
+
+    def obtener(self, url, tamano='mediana', timeout=10):
+        """Bytes WEBP de la miniatura de ``url`` (None si no se pudo obtener)."""
+        ruta = self.ruta(url, tamano, timeout)
+        if ruta is None:
+            return None
+        with open(ruta, 'rb') as f:
+            return f.read()
+
+    def obtener_varias(self, urls, tamano='mediana', timeout=10, max_workers=PREFETCH_WORKERS):
+        """Miniaturas de varias URLs obtenidas en paralelo: ``{url: bytes | None}``.
+
+        El lote tiene un plazo total proporcional a ``timeout``; las imágenes que
+        fallan o no llegan a tiempo quedan en None sin bloquear al resto.
+        """
+        unicas = list(dict.fromkeys(url for url in urls if url))
+        if not unicas:
+            return {}
+        workers = min(max_workers, len(unicas))
+        executor = ThreadPoolExecutor(max_workers=workers)
+        futuros = {url: executor.submit(self.obtener, url, tamano, timeout) for url in unicas}
+        # El timeout de requests es por operación de socket: una descarga que gotea
+        # bytes puede no terminar nunca, así que el lote tiene un plazo total
+        plazo = timeout * math.ceil(len(unicas) / workers)
+        wait(futuros.values(), timeout=plazo)
+        # No se espera a las descargas colgadas; las que aún no empezaron se cancelan
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        resultados = {}
+        for url, futuro in futuros.items():
+            if not futuro.done():
+                logger.warning(f"La imagen {url} no llegó en {plazo}s, se omite")
+                resultados[url] = None
+                continue
+            try:
+                resultados[url] = futuro.result()
+            except Exception as e:
+                # Por ejemplo, el archivo desalojado entre la resolución y la lectura
+                logger.warning(f"No se pudo leer la imagen {url}: {e}")
+                resultados[url] = None
+        return resultados
+
+    def precargar(self, urls, timeout=15, max_workers=PREFETCH_WORKERS):
+        """Descarga en paralelo las imágenes de ``urls`` y genera todas sus miniaturas.
+
+        Al terminar actualiza el manifiesto; las URLs que fallan conservan su
+        entrada anterior, si la había. Devuelve ``(precargadas, fallidas)``.
+        """
+        unicas = list(dict.fromkeys(url_imagen(url) for url in urls if url))
+        if not unicas:
+            return 0, 0
+
+        def precargar_una(url):
+            hash_contenido = self._resolver(url, timeout)
+            # Se fija de inmediato: otra caché sobre el directorio podría desalojarla
+            # antes de que se escriba el manifiesto
+            with self._conectar() as conn:
+                conn.execute("INSERT OR IGNORE INTO fijadas VALUES (?)", (hash_contenido,))
+            return {
+                'hash': hash_contenido,
+                'miniaturas': {
+                    tamano: os.path.relpath(self._miniatura(hash_contenido, tamano), self.directorio)
+                    for tamano in TAMANOS
+                },
+            }
+
+        entradas, fallidas = {}, 0
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(unicas))) as executor:
+            futuros = {url: executor.submit(precargar_una, url) for url in unicas}
+            for url, futuro in futuros.items():
+                try:
+                    entradas[url] = futuro.result()
+                except Exception as e:
+                    fallidas += 1
+                    logger.warning(f"No se pudo precargar la imagen {url}: {e}")
+
+        imagenes = dict(self._leer_manifiesto())
+        imagenes.update(entradas)
+        manifiesto = {
+            'generado': datetime.now(timezone.utc).isoformat(),
+            'tamanos': TAMANOS,
+            'imagenes': imagenes,
+        }
+        self._escribir(os.path.join(self.directorio, MANIFIESTO),
+                       json.dumps(manifiesto, ensure_ascii=False).encode('utf-8'))
+        # Quedan fijadas exactamente las imágenes del manifiesto
+        with self._conectar() as conn:
+            conn.execute("DELETE FROM fijadas")
+            conn.executemany("INSERT OR IGNORE INTO fijadas VALUES (?)",
+                             [(e['hash'],) for e in imagenes.values() if e.get('hash')])
+        return len(entradas), fallidas
+
+    def _leer_manifiesto(self):
+        """Entradas del manifiesto (``{url: {...}}``), recargado solo si cambió en disco."""
+        ruta = os.path.join(self.directorio, MANIFIESTO)
+        try:
+            mtime = os.stat(ruta).st_mtime
+        except FileNotFoundError:
+            return {}
+        if mtime != self._manifiesto_mtime:
+            with self._lock:
+                if mtime != self._manifiesto_mtime:
+                    try:
+                        with open(ruta, 'r', encoding='utf-8') as f:
+                            self._manifiesto = json.load(f).get('imagenes', {})
+                    except ValueError as e:
+                        logger.warning(f"Manifiesto de imágenes ilegible, se ignora: {e}")
+                        self._manifiesto = {}
+                    self._manifiesto_mtime = mtime
+        return self._manifiesto
+
+    def _ruta_manifiesto(self, url, tamano):
+        """Ruta de la miniatura de ``url`` según el manifiesto, si existe en disco."""
+        entrada = self._leer_manifiesto().get(url)
+        if not entrada or tamano not in entrada['miniaturas']:
+            return None
+        ruta = os.path.join(self.directorio, entrada['miniaturas'][tamano])
+        return ruta if os.path.exists(ruta) else None
+
+    def guardar(self, url, contenido, etag=None, last_modified=None):
+        """Registra en la caché una imagen ya descargada y devuelve su hash."""
+        hash_contenido = hashlib.sha256(contenido).hexdigest()
+        if not os.path.exists(self._ruta_original(hash_contenido)):
+            self._escribir(self._ruta_original(hash_contenido), contenido)
+        ahora = time.time()
+        with self._conectar() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO imagenes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, hash_contenido, etag, last_modified, len(contenido), ahora, ahora),
+            )
+            total = conn.execute(SQL_TAMANO_TOTAL).fetchone()[0] if self.max_bytes else 0
+        if total > self.max_bytes:
+            self._desalojar()
+        return hash_contenido
+
+    def _resolver(self, url, timeout):
+        """Hash del contenido de ``url``: desde disco si está fresco, si no del CDN."""
+        with self._conectar() as conn:
+            fila = conn.execute(
+                "SELECT hash, etag, last_modified, descargada_en FROM imagenes WHERE url = ?", (url,)
+            ).fetchone()
+
+        if fila and os.path.exists(self._ruta_original(fila[0])):
+            hash_contenido, etag, last_modified, descargada_en = fila
+            ahora = time.time()
+            if ahora - descargada_en < self.ttl:
+                with self._conectar() as conn:
+                    conn.execute("UPDATE imagenes SET ultimo_acceso = ? WHERE url = ?", (ahora, url))
+                return hash_contenido
+
+            cabeceras = {}
+            if etag:
+                cabeceras['If-None-Match'] = etag
+            if last_modified:
+                cabeceras['If-Modified-Since'] = last_modified
+            try:
+                response = self.session.get(url, headers=cabeceras, timeout=timeout)
+            except requests.RequestException as e:
+                # Sin conexión se sigue sirviendo la copia local
+                logger.warning(f"No se pudo revalidar {url}, se usa la copia en caché: {e}")
+                return hash_contenido
+            if response.status_code == 304:
+                with self._conectar() as conn:
+                    conn.execute(
+                        "UPDATE imagenes SET descargada_en = ?, ultimo_acceso = ? WHERE url = ?",
+                        (ahora, ahora, url),
+                    )
+                return hash_contenido
+        else:
+            response = self.session.get(url, timeout=timeout)
+
+        response.raise_for_status()
+        return self.guardar(url, response.content,
+                            response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+    def _miniatura(self, hash_contenido, tamano):
+        """Ruta de la miniatura ``tamano`` del original ``hash_contenido``, generándola si falta."""
+        ruta = self._ruta_miniatura(hash_contenido, tamano)
+        if not os.path.exists(ruta):
+            lado = TAMANOS[tamano]
+            with Image.open(self._ruta_original(hash_contenido)) as img:
+                img.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+                buffer = io.BytesIO()
+                img.save(buffer, format='WEBP', quality=85)
+            self._escribir(ruta, buffer.getvalue())
+            with self._conectar() as conn:
+                conn.execute("INSERT OR REPLACE INTO miniaturas VALUES (?, ?, ?)",
+                             (hash_contenido, tamano, buffer.tell()))
+        return ruta
+
+    def _desalojar(self):
+        """Elimina las imágenes menos usadas hasta quedar por debajo del 90 % del máximo."""
+        if not self.max_bytes:
+            return
+        with self._lock, self._conectar() as conn:
+            # Los tamaños salen del índice: no se recorre el disco
+            total = conn.execute(SQL_TAMANO_TOTAL).fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            objetivo = self.max_bytes * 0.9
+            filas = conn.execute(
+                "SELECT i.hash, MAX(i.ultimo_acceso) AS acceso, MAX(i.bytes) + "
+                "  (SELECT COALESCE(SUM(m.bytes), 0) FROM miniaturas m WHERE m.hash = i.hash) "
+                "FROM imagenes i WHERE i.hash NOT IN (SELECT hash FROM fijadas) "
+                "GROUP BY i.hash ORDER BY acceso"
+            ).fetchall()
+            for hash_contenido, _, tamano in filas:
+                if total <= objetivo:
+                    break
+                rutas = [self._ruta_original(hash_contenido)]
+                rutas += [self._ruta_miniatura(hash_contenido, t) for t in TAMANOS]
+                for ruta in rutas:
+                    if os.path.exists(ruta):
+                        os.remove(ruta)
+                conn.execute("DELETE FROM imagenes WHERE hash = ?", (hash_contenido,))
+                conn.execute("DELETE FROM miniaturas WHERE hash = ?", (hash_contenido,))
+                total -= tamano
+            logger.info(f"Caché de imágenes reducida a {total / 1024 / 1024:.1f} MB")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Lectura y escritura de los volcados crudos de la API en ``data/``.
+
+Formatos soportados (variable ``EXTRACTOR_FORMATO_RAW``):
+
+    json       -> simpsons_characters.json      (arreglo JSON)
+    jsonl      -> simpsons_characters.jsonl     (un registro por línea)
+    jsonl.gz   -> simpsons_characters.jsonl.gz  (JSON Lines comprimido)
+
+Los registros se escriben a medida que llegan las páginas, de modo que la
+memoria usada depende del tamaño de página y no del catálogo completo.
+"""
+import os
+import gzip
+import json
+
+FORMATOS = {
+    'json': '.json',
+    'jsonl': '.jsonl',
+    'jsonl.gz': '.jsonl.gz',
+}
+
+
+def ruta_crudo(data_dir, nombre, formato):
+    """Ruta del volcado ``nombre`` en el formato indicado."""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de volcado no soportado: {formato}")
+    return os.path.join(data_dir, nombre + FORMATOS[formato])
+
+
+def buscar_crudo(data_dir, nombre):
+    """Devuelve el volcado más reciente de ``nombre`` en cualquier formato, o None."""
+    candidatos = [os.path.join(data_dir, nombre + ext) for ext in FORMATOS.values()]
+    existentes = [ruta for ruta in candidatos if os.path.exists(ruta)]
+    if not existentes:
+        return None
+    return max(existentes, key=os.path.getmtime)
+
+
+class EscritorCrudo:
+    """Escribe registros en streaming en un volcado JSON, JSON Lines o JSON Lines gzip.
+
+    Al sobrescribir se escribe en un archivo temporal que reemplaza al final al
+    original, así una ejecución interrumpida no deja un volcado corrupto. Con
+    ``anexar=True`` (solo JSON Lines) los registros se agregan al final del archivo.
+    """
+
+    def __init__(self, ruta, anexar=False):
+        self.ruta = ruta
+        self.comprimido = ruta.endswith('.gz')
+        self.lineas = self.comprimido or ruta.endswith('.jsonl')
+        if anexar and not self.lineas:
+            raise ValueError("Solo los volcados JSON Lines admiten anexar registros")
+        self.anexar = anexar
+        self.total = 0
+        self._destino = ruta if anexar else ruta + '.tmp'
+        self._archivo = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+        modo = 'at' if self.anexar else 'wt'
+        if self.comprimido:
+            self._archivo = gzip.open(self._destino, modo, encoding='utf-8')
+        else:
+            self._archivo = open(self._destino, modo, encoding='utf-8')
+        if not self.lineas:
+            self._archivo.write('[')
+        return self
+
+    def escribir(self, registros):
+        """Agrega una lista de registros al volcado."""
+        for item in registros:
+            linea = json.dumps(item, ensure_ascii=False)
+            if self.lineas:
+                self._archivo.write(linea + '\n')
+            else:
+                self._archivo.write(('\n' if self.total == 0 else ',\n') + linea)
+            self.total += 1
+
+    def vaciar(self):
+        """Fuerza a disco lo escrito hasta ahora (p. ej. antes de guardar un checkpoint)."""
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.lineas:
+            self._archivo.write('\n]\n')
+        self._archivo.close()
+        if self.anexar:
+            return False
+        if exc_type is None:
+            os.replace(self._destino, self.ruta)
+        else:
+            os.remove(self._destino)
+        return False
+
+
+def leer_registros(ruta):
+    """Genera los registros de un volcado en cualquiera de los formatos soportados."""
+    if ruta.endswith('.json'):
+        with open(ruta, 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+        return
+
+    abrir = gzip.open if ruta.endswith('.gz') else open
+    with abrir(ruta, 'rt', encoding='utf-8') as f:
+        for linea in f:
+            if linea.strip():
+                yield json.loads(linea)
+
+
+def cargar_registros(ruta):
+    """Carga un volcado completo; si un id aparece varias veces gana la última versión."""
+    por_id = {}
+    sin_id = []
+    for item in leer_registros(ruta):
+        if item.get('id') is None:
+            sin_id.append(item)
+        else:
+            por_id[item['id']] = item
+    return list(por_id.values()) + sin_id
@@ -4,6 +4,16 @@ import sys
 import requests
 import json
 import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 import logging
 
@@ -11,6 +21,8 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if BASE_DIR not in sys.path:
     sys.path.insert(0, BASE_DIR)
 
+from scripts.datos_crudos import FORMATOS, EscritorCrudo, buscar_crudo, leer_registros, ruta_crudo
+
 load_dotenv()
 
 log_dir = os.path.join(BASE_DIR, 'logs')
@@ -27,190 +39,673 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Respuestas HTTP que se reintentan con backoff
+CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
+# Fallos seguidos tras los que se abandona la paginación secuencial (sin total conocido)
+MAX_FALLOS_CONSECUTIVOS = 3
+# Marca de vistas de agregados sin refrescar tras un error (se reintenta en la próxima ejecución)
+VISTAS_PENDIENTES = os.path.join(BASE_DIR, 'data', '.vistas_pendientes')
+
+
+class LimitadorTasa:
+    """Limita la tasa de peticiones compartida entre hilos (peticiones/segundo)."""
+
+    def __init__(self, peticiones_por_segundo):
+        self.intervalo = 1.0 / peticiones_por_segundo if peticiones_por_segundo > 0 else 0.0
+        self._lock = threading.Lock()
+        self._siguiente = 0.0
+
+    def esperar(self):
+        """Bloquea hasta que haya un turno disponible."""
+        if not self.intervalo:
+            return
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self._siguiente)
+            self._siguiente = turno + self.intervalo
+        espera = turno - ahora
+        if espera > 0:
+            time.sleep(espera)
+
+
+def _es_404(error):
+    """True si ``error`` es una respuesta HTTP 404 (página inexistente)."""
+    respuesta = getattr(error, 'response', None)
+    return respuesta is not None and respuesta.status_code == 404
+
+
+def _hash_registro(item):
+    """Hash estable del contenido de un registro de la API."""
+    contenido = json.dumps(item, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+
 
 class SimpsonsExtractor:
-    def __init__(self):
+    ENDPOINTS = ('characters', 'episodes', 'locations')
+    DESTINOS = {
+        'characters': ('simpsons_characters', '_guardar_personajes'),
+        'episodes': ('simpsons_episodes', '_guardar_episodios'),
+        'locations': ('simpsons_locations', '_guardar_ubicaciones'),
+    }
+
+    def __init__(self, max_workers=None, peticiones_por_segundo=None):
         self.API_URL = os.getenv('API_URL')
         if not self.API_URL:
             raise ValueError("API_URL no configurada en .env")
 
-    def _extraer_paginado(self, endpoint):
-        """Extrae todos los resultados de un endpoint paginado."""
-        todos = []
-        page = 1
+        self.max_workers = max_workers or int(os.getenv('EXTRACTOR_WORKERS', '4'))
+        if peticiones_por_segundo is None:
+            peticiones_por_segundo = float(os.getenv('EXTRACTOR_RPS', '3'))
+        self.limitador = LimitadorTasa(peticiones_por_segundo)
+        self.lote_db = int(os.getenv('EXTRACTOR_LOTE_DB', '500'))
+        self.reintentos = int(os.getenv('EXTRACTOR_REINTENTOS', '4'))
+        self.backoff_base = float(os.getenv('EXTRACTOR_BACKOFF_BASE', '0.5'))
+        self.backoff_max = float(os.getenv('EXTRACTOR_BACKOFF_MAX', '30'))
+        self.formato_raw = os.getenv('EXTRACTOR_FORMATO_RAW', 'json')
+        if self.formato_raw not in FORMATOS:
+            raise ValueError(f"EXTRACTOR_FORMATO_RAW debe ser uno de: {', '.join(FORMATOS)}")
+
+        # Una sola sesión con pool de conexiones (reutiliza TCP/TLS entre páginas)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=len(self.ENDPOINTS),
+            pool_maxsize=self.max_workers * len(self.ENDPOINTS),
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.paginas_faltantes = {ep: [] for ep in self.ENDPOINTS}
+        self.resumen = {ep: {'paginas': 0, 'registros': 0} for ep in self.ENDPOINTS}
+        # Filas insertadas o actualizadas en la ejecución (los endpoints escriben en paralelo)
+        self.filas_modificadas = 0
+        self._lock_modificadas = threading.Lock()
+
+    def _obtener_pagina(self, endpoint, page):
+        """Descarga una página de un endpoint respetando el límite de tasa.
+
+        Reintenta timeouts, errores de conexión, 429 y 5xx con backoff exponencial
+        y jitter, respetando la cabecera ``Retry-After`` cuando la API la envía.
+        """
+        url = f"{self.API_URL}/{endpoint}"
+        intento = 0
         while True:
+            self.limitador.esperar()
             try:
-                url = f"{self.API_URL}/{endpoint}?page={page}"
-                response = requests.get(url, timeout=15)
+                response = self.session.get(url, params={'page': page}, timeout=15)
+                if response.status_code in CODIGOS_REINTENTABLES and intento < self.reintentos:
+                    espera = self._espera_reintento(intento, response.headers.get('Retry-After'))
+                    logger.warning(f"[{endpoint}] Página {page}: HTTP {response.status_code}, "
+                                   f"reintento {intento + 1}/{self.reintentos} en {espera:.1f}s")
+                    time.sleep(espera)
+                    intento += 1
+                    continue
                 response.raise_for_status()
-                data = response.json()
-
-                resultados = data.get('results', [])
-                if not resultados:
-                    break
-
-                todos.extend(resultados)
-                logger.info(f"[{endpoint}] Página {page}: {len(resultados)} registros")
+                return response.json()
+            except (requests.Timeout, requests.ConnectionError) as e:
+                if intento >= self.reintentos:
+                    raise
+                espera = self._espera_reintento(intento)
+                logger.warning(f"[{endpoint}] Página {page}: {e}, "
+                               f"reintento {intento + 1}/{self.reintentos} en {espera:.1f}s")
+                time.sleep(espera)
+                intento += 1
+
+    def _espera_reintento(self, intento, retry_after=None):
+        """Segundos a esperar antes del reintento ``intento`` (backoff exponencial con jitter)."""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                try:
+                    fecha = parsedate_to_datetime(retry_after)
+                    return min(max((fecha - datetime.now(timezone.utc)).total_seconds(), 0.0),
+                               self.backoff_max)
+                except (TypeError, ValueError):
+                    pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** intento))
+
+    @staticmethod
+    def _total_paginas(data, page):
+        """Obtiene el total de páginas a partir de una respuesta (None si no se conoce)."""
+        if data.get('pages'):
+            return int(data['pages'])
+        resultados = data.get('results', [])
+        if page == 1 and data.get('count') and resultados:
+            return -(-int(data['count']) // len(resultados))
+        return None
+
+    def _extraer_paginado(self, endpoint, desde=1):
+        """Extrae los resultados de un endpoint paginado a partir de la página ``desde``.
+
+        Genera tuplas ``(pagina, resultados)``. Lee el total de páginas de la primera
+        respuesta y descarga el resto en paralelo con un pool acotado de hilos; si la
+        API no informa el total, recorre las páginas siguiendo ``next``.
+
+        Las páginas que fallan tras agotar los reintentos no detienen la paginación:
+        pasan a una cola que se vuelve a intentar al final (por eso pueden llegar
+        fuera de orden). Las que siguen fallando quedan en ``self.paginas_faltantes``.
+        """
+        cola_reintentos = []
+        try:
+            data = self._obtener_pagina(endpoint, desde)
+        except Exception as e:
+            if desde > 1 and _es_404(e):
+                # Se reanudó más allá del final del catálogo: no hay nada nuevo
+                logger.info(f"[{endpoint}] La página {desde} ya no existe, sin páginas nuevas")
+                return
+            logger.error(f"[{endpoint}] Error en página {desde}: {e}")
+            self.paginas_faltantes[endpoint].append(desde)
+            return
+
+        yield self._registrar_pagina(endpoint, desde, data)
+
+        total_paginas = self._total_paginas(data, desde)
+        if total_paginas is None:
+            if data.get('next') and data.get('results'):
+                yield from self._extraer_secuencial(endpoint, desde + 1, cola_reintentos)
+        elif total_paginas > desde:
+            yield from self._extraer_paralelo(endpoint, range(desde + 1, total_paginas + 1),
+                                              cola_reintentos)
+
+        for page in cola_reintentos:
+            try:
+                data = self._obtener_pagina(endpoint, page)
+            except Exception as e:
+                logger.error(f"[{endpoint}] Página {page} no recuperada: {e}")
+                self.paginas_faltantes[endpoint].append(page)
+                continue
+            logger.info(f"[{endpoint}] Página {page} recuperada")
+            yield self._registrar_pagina(endpoint, page, data)
+
+    def _extraer_paralelo(self, endpoint, paginas, cola_reintentos):
+        """Descarga ``paginas`` en paralelo y las genera en orden.
+
+        Solo hay ``2 * max_workers`` descargas en vuelo: la ventana se rellena a
+        medida que se consumen las páginas, así la memoria no depende del tamaño
+        del catálogo. Si el consumidor se detiene, las descargas pendientes se cancelan.
+        """
+        paginas = iter(paginas)
+        ventana = deque()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def rellenar():
+                for page in islice(paginas, 2 * self.max_workers - len(ventana)):
+                    ventana.append((page, executor.submit(self._obtener_pagina, endpoint, page)))
 
-                if not data.get('next'):
+            try:
+                rellenar()
+                while ventana:
+                    page, futuro = ventana.popleft()
+                    try:
+                        data = futuro.result()
+                    except Exception as e:
+                        logger.error(f"[{endpoint}] Error en página {page}, se reintentará al final: {e}")
+                        cola_reintentos.append(page)
+                        rellenar()
+                        continue
+                    rellenar()
+                    yield self._registrar_pagina(endpoint, page, data)
+            finally:
+                for _, futuro in ventana:
+                    futuro.cancel()
+
+    def _extraer_secuencial(self, endpoint, page, cola_reintentos):
+        """Recorre las páginas una a una siguiendo ``next`` a partir de ``page``."""
+        fallos_consecutivos = 0
+        while fallos_consecutivos < MAX_FALLOS_CONSECUTIVOS:
+            try:
+                data = self._obtener_pagina(endpoint, page)
+            except Exception as e:
+                if _es_404(e):
+                    # Fin del catálogo
                     break
-
+                logger.error(f"[{endpoint}] Error en página {page}, se reintentará al final: {e}")
+                cola_reintentos.append(page)
+                fallos_consecutivos += 1
                 page += 1
-                time.sleep(0.3)
+                continue
 
-            except Exception as e:
-                logger.error(f"[{endpoint}] Error en página {page}: {e}")
+            fallos_consecutivos = 0
+            if not data.get('results'):
                 break
 
-        logger.info(f"[{endpoint}] Total extraído: {len(todos)} registros")
-        return todos
+            yield self._registrar_pagina(endpoint, page, data)
 
-    def ejecutar_extraccion(self):
-        """Ejecuta la extracción de personajes, episodios y ubicaciones."""
-        logger.info("Iniciando extracción completa")
-
-        # Personajes
-        personajes = self._extraer_paginado('characters')
-        self._guardar_json(personajes, 'simpsons_characters.json')
-        self._guardar_personajes(personajes)
+            if not data.get('next'):
+                break
 
-        # Episodios
-        episodios = self._extraer_paginado('episodes')
-        self._guardar_json(episodios, 'simpsons_episodes.json')
-        self._guardar_episodios(episodios)
+            page += 1
+
+    def _registrar_pagina(self, endpoint, page, data):
+        """Contabiliza una página descargada y devuelve ``(pagina, resultados)``."""
+        resultados = data.get('results', [])
+        self.resumen[endpoint]['paginas'] += 1
+        self.resumen[endpoint]['registros'] += len(resultados)
+        logger.info(f"[{endpoint}] Página {page}: {len(resultados)} registros")
+        return page, resultados
+
+    @staticmethod
+    def _ultima_pagina_contigua(desde, paginas):
+        """Última página ``p`` tal que todas las páginas de ``desde`` a ``p`` están en ``paginas``."""
+        page = desde - 1
+        while page + 1 in paginas:
+            page += 1
+        return page
+
+    def ejecutar_extraccion(self, incremental=False, imagenes=False):
+        """Ejecuta la extracción de personajes, episodios y ubicaciones.
+
+        Los tres endpoints se sincronizan en paralelo. En modo incremental solo se
+        descargan las páginas desde el último checkpoint y solo se escriben
+        los registros cuyo hash cambió. Con ``imagenes=True`` además se precargan
+        todas las imágenes en el almacén local compartido. Devuelve el resumen por
+        endpoint.
+        """
+        modo = 'incremental' if incremental else 'completa'
+        logger.info(f"Iniciando extracción {modo}")
+        self.paginas_faltantes = {ep: [] for ep in self.ENDPOINTS}
+        self.resumen = {ep: {'paginas': 0, 'registros': 0} for ep in self.ENDPOINTS}
+        self.filas_modificadas = 0
+        sincronizar = self._sincronizar_incremental if incremental else self._sincronizar_completo
+
+        with ThreadPoolExecutor(max_workers=len(self.ENDPOINTS)) as executor:
+            futuros = [executor.submit(sincronizar, ep) for ep in self.ENDPOINTS]
+            for futuro in futuros:
+                futuro.result()
+
+        # Sin vistas refrescadas no se publica: la app guardaría agregados viejos
+        # bajo la versión nueva
+        if self._refrescar_agregados():
+            self._publicar_version()
+        else:
+            logger.info("Se mantiene la versión de los datos")
+        if imagenes:
+            self._precargar_imagenes()
+        self._registrar_resumen()
+        logger.info(f"Extracción {modo} finalizada")
+        return self.resumen
+
+    def _sincronizar_completo(self, endpoint):
+        """Descarga todas las páginas de un endpoint y las guarda en streaming.
+
+        Cada página se escribe en el volcado crudo apenas llega y se acumula en un
+        lote que se guarda en la base al alcanzar ``EXTRACTOR_LOTE_DB`` registros,
+        así la memoria depende del tamaño de página y no del catálogo.
+        """
+        archivo, guardar = self.DESTINOS[endpoint]
+        guardar = getattr(self, guardar)
+        hashes, paginas, lote = {}, set(), []
+        exito = True
+
+        with EscritorCrudo(self._ruta_crudo(archivo)) as escritor:
+            for page, resultados in self._extraer_paginado(endpoint):
+                escritor.escribir(resultados)
+                paginas.add(page)
+                hashes.update((str(item['id']), _hash_registro(item)) for item in resultados if 'id' in item)
+                lote.extend(resultados)
+                if len(lote) >= self.lote_db:
+                    exito = guardar(lote) and exito
+                    lote = []
+            if lote:
+                exito = guardar(lote) and exito
+        logger.info(f"[{endpoint}] Total extraído: {escritor.total} registros "
+                    f"({os.path.basename(escritor.ruta)})")
+
+        ultima_pagina = self._ultima_pagina_contigua(1, paginas)
+        if exito and ultima_pagina:
+            self._guardar_estado(endpoint, ultima_pagina, hashes,
+                                 completado=not self.paginas_faltantes[endpoint])
+        return escritor.total
+
+    def _sincronizar_incremental(self, endpoint):
+        """Sincroniza un endpoint a partir de su checkpoint, página a página.
+
+        Tras guardar cada página se actualiza el checkpoint, de modo que una
+        ejecución interrumpida se reanuda desde la última página completada.
+        Los registros cambiados se escriben en disco antes de avanzar el
+        checkpoint: con volcados JSON Lines se anexan al archivo y con JSON van a
+        un archivo de pendientes que se fusiona al terminar (o al inicio de la
+        siguiente ejecución, si esta se interrumpió).
+        """
+        archivo, guardar = self.DESTINOS[endpoint]
+        self._sembrar_crudo(archivo)
+        pendientes_json = self._ruta_pendientes(archivo)
+        if os.path.exists(pendientes_json):
+            logger.info(f"[{endpoint}] Fusionando cambios pendientes de una ejecución interrumpida")
+            self._fusionar_json(leer_registros(pendientes_json), archivo)
+            os.remove(pendientes_json)
+        estado = self._cargar_estado(endpoint)
+        hashes = estado['hashes']
+        # Se relee la última página guardada: pudo haber crecido desde la ejecución
+        # anterior y, como los registros sin cambios se omiten por hash, releerla es barato
+        desde = max(estado['ultima_pagina'], 1)
+        logger.info(f"[{endpoint}] Sincronización incremental desde la página {desde}")
+
+        destino = pendientes_json if self.formato_raw == 'json' else self._ruta_crudo(archivo)
+        total_cambiados = 0
+        completado = True
+        guardadas = set()
+        with EscritorCrudo(destino, anexar=True) as escritor:
+            for page, resultados in self._extraer_paginado(endpoint, desde):
+                if not resultados and page > 1:
+                    # Página vacía más allá del final: no avanza el checkpoint
+                    continue
+                nuevos, pendientes = {}, []
+                for item in resultados:
+                    if 'id' not in item:
+                        continue
+                    valor = _hash_registro(item)
+                    if hashes.get(str(item['id'])) != valor:
+                        nuevos[str(item['id'])] = valor
+                        pendientes.append(item)
+
+                if pendientes and not getattr(self, guardar)(pendientes):
+                    logger.error(f"[{endpoint}] Sincronización detenida en la página {page}")
+                    completado = False
+                    break
 
-        # Ubicaciones
-        ubicaciones = self._extraer_paginado('locations')
-        self._guardar_json(ubicaciones, 'simpsons_locations.json')
-        self._guardar_ubicaciones(ubicaciones)
+                escritor.escribir(pendientes)
+                # Los cambios quedan en disco antes de que el checkpoint los dé por vistos
+                escritor.vaciar()
+                total_cambiados += len(pendientes)
+                hashes.update(nuevos)
+                guardadas.add(page)
+                # El checkpoint solo avanza sobre páginas contiguas ya guardadas
+                ultima_pagina = max(self._ultima_pagina_contigua(desde, guardadas), estado['ultima_pagina'])
+                self._guardar_estado(endpoint, ultima_pagina, hashes, completado=False)
+
+        # Llegar al final (aunque no haya páginas nuevas) completa la sincronización
+        ultima_pagina = max(guardadas, default=estado['ultima_pagina'])
+        if ultima_pagina and completado and not self.paginas_faltantes[endpoint]:
+            self._guardar_estado(endpoint, ultima_pagina, hashes, completado=True)
+
+        if destino == pendientes_json:
+            if total_cambiados:
+                self._fusionar_json(leer_registros(pendientes_json), archivo)
+            os.remove(pendientes_json)
+        logger.info(f"[{endpoint}] {total_cambiados} registros nuevos o modificados")
+        return total_cambiados
+
+    def _refrescar_agregados(self):
+        """Refresca las vistas materializadas que consume el dashboard.
+
+        Si el índice de palabras está vacío (base anterior a su creación) se
+        construye completo a partir de las frases ya guardadas. Las vistas solo
+        se refrescan si la ejecución modificó alguna fila o si quedaron
+        desactualizadas por un error en una ejecución anterior (marca en
+        ``VISTAS_PENDIENTES``). Devuelve True si se refrescaron, es decir, si hay
+        una versión nueva de los datos lista para publicar.
+        """
+        pendiente = os.path.exists(VISTAS_PENDIENTES)
+        try:
+            from sqlalchemy import text
+            from db.database import sesion
+            from db.palabras import actualizar_palabras
+            from db.vistas import refrescar_vistas
+
+            with sesion() as db:
+                vacio = db.execute(text("SELECT NOT EXISTS (SELECT 1 FROM palabras_frases)")).scalar()
+                # Sin frases guardadas la reconstrucción no inserta nada: no es un cambio
+                if vacio and actualizar_palabras(db):
+                    logger.info("Índice de palabras reconstruido")
+                    with self._lock_modificadas:
+                        self.filas_modificadas += 1
+            if not self.filas_modificadas and not pendiente:
+                logger.info("Sin cambios en la base, las vistas de agregados se mantienen")
+                return False
+            refrescar_vistas()
+            logger.info("Vistas de agregados refrescadas")
+            if pendiente:
+                os.remove(VISTAS_PENDIENTES)
+            return True
+        except Exception as e:
+            logger.error(f"Error refrescando vistas de agregados, se reintentará en la próxima ejecución: {e}")
+            if self.filas_modificadas or pendiente:
+                os.makedirs(os.path.dirname(VISTAS_PENDIENTES), exist_ok=True)
+                open(VISTAS_PENDIENTES, 'a').close()
+            return False
+
+    def _precargar_imagenes(self):
+        """Descarga retratos e imágenes de episodios y ubicaciones al almacén compartido.
+
+        Genera todas las miniaturas estándar y el manifiesto que leen el
+        visualizador y la app, que así no descargan ni redimensionan nada.
+        """
+        try:
+            from sqlalchemy import select, union_all
+            from db.database import sesion
+            from db.models import Personaje, Episodio, Ubicacion
+            from imagenes.cache import CacheImagenes, PREFETCH_WORKERS
+
+            consulta = union_all(
+                select(Personaje.portrait_path.label('path')).where(Personaje.portrait_path.isnot(None)),
+                select(Episodio.image_path).where(Episodio.image_path.isnot(None)),
+                select(Ubicacion.image_path).where(Ubicacion.image_path.isnot(None)),
+            )
+            with sesion() as db:
+                paths = db.execute(consulta).scalars().all()
+
+            # Sin límite de tamaño: el almacén debe contener el catálogo completo
+            almacen = CacheImagenes(max_bytes=0)
+            workers = int(os.getenv('EXTRACTOR_IMAGENES_WORKERS', str(PREFETCH_WORKERS)))
+            logger.info(f"Precargando {len(paths)} imágenes con {workers} hilos")
+            precargadas, fallidas = almacen.precargar(paths, max_workers=workers)
+            logger.info(f"Imágenes precargadas: {precargadas}, fallidas: {fallidas}")
+        except Exception as e:
+            logger.error(f"Error precargando imágenes: {e}")
 
-        logger.info("Extracción completa finalizada")
-        return personajes, episodios, ubicaciones
+    def _publicar_version(self):
+        """Incrementa la versión de los datos (solo se llama tras refrescar los agregados).
 
-    def _guardar_json(self, datos, nombre_archivo):
-        """Guarda datos en un archivo JSON."""
-        ruta = os.path.join(BASE_DIR, 'data', nombre_archivo)
-        os.makedirs(os.path.dirname(ruta), exist_ok=True)
-        with open(ruta, 'w', encoding='utf-8') as f:
-            json.dump(datos, f, ensure_ascii=False, indent=4)
-        logger.info(f"JSON guardado: {nombre_archivo} ({len(datos)} registros)")
+        La app usa esa versión como clave de caché, así recarga los datos sin
+        reiniciarse y no vuelve a consultar las tablas cuando nada cambió.
+        """
+        try:
+            from db.version import incrementar_version
+            version = incrementar_version()
+            logger.info(f"Versión de los datos publicada: {version} ({self.filas_modificadas} filas modificadas)")
+        except Exception as e:
+            logger.error(f"Error publicando la versión de los datos: {e}")
+
+    def _registrar_resumen(self):
+        """Registra el resumen de la ejecución, incluidas las páginas que faltan."""
+        logger.info("Resumen de extracción:")
+        for endpoint in self.ENDPOINTS:
+            resumen = self.resumen[endpoint]
+            faltantes = sorted(self.paginas_faltantes[endpoint])
+            logger.info(f"  [{endpoint}] {resumen['paginas']} páginas, {resumen['registros']} registros")
+            if faltantes:
+                logger.warning(f"  [{endpoint}] Páginas faltantes: {', '.join(map(str, faltantes))}")
+
+        from db.database import estadisticas_pool
+        logger.info(f"Pool de conexiones: {estadisticas_pool()}")
+
+    def _cargar_estado(self, endpoint):
+        """Lee el checkpoint de sincronización de un endpoint."""
+        from db.database import sesion
+        from db.models import EstadoSincronizacion
+
+        with sesion() as db:
+            estado = db.get(EstadoSincronizacion, endpoint)
+            if estado is None:
+                return {'ultima_pagina': 0, 'total_registros': 0, 'hashes': {}, 'completado': False}
+            return {
+                'ultima_pagina': estado.ultima_pagina,
+                'total_registros': estado.total_registros,
+                'hashes': dict(estado.hashes or {}),
+                'completado': estado.completado,
+            }
+
+    def _guardar_estado(self, endpoint, ultima_pagina, hashes, completado):
+        """Persiste el checkpoint de sincronización de un endpoint."""
+        from db.database import sesion
+        from db.models import EstadoSincronizacion
+
+        with sesion() as db:
+            db.merge(EstadoSincronizacion(
+                endpoint=endpoint,
+                ultima_pagina=ultima_pagina,
+                total_registros=len(hashes),
+                hashes=dict(hashes),
+                completado=completado,
+            ))
+
+    def _ruta_crudo(self, nombre):
+        """Ruta del volcado crudo ``nombre`` en el formato configurado."""
+        return ruta_crudo(os.path.join(BASE_DIR, 'data'), nombre, self.formato_raw)
+
+    def _ruta_pendientes(self, nombre):
+        """Archivo JSON Lines con los cambios aún no fusionados en el volcado JSON."""
+        return os.path.join(BASE_DIR, 'data', f"{nombre}.pendientes.jsonl")
+
+    def _sembrar_crudo(self, nombre):
+        """Asegura que el volcado del formato configurado sea el más reciente.
+
+        Si el último volcado completo se escribió en otro formato (p. ej. JSON y
+        ahora se usa JSON Lines), se copia al formato actual antes de anexar o
+        fusionar cambios; si no, el lector vería solo los cambios incrementales.
+        """
+        ruta = self._ruta_crudo(nombre)
+        vigente = buscar_crudo(os.path.join(BASE_DIR, 'data'), nombre)
+        if vigente is None or vigente == ruta:
+            return
+        logger.info(f"Copiando {os.path.basename(vigente)} a {os.path.basename(ruta)} "
+                    f"antes de la sincronización incremental")
+        with EscritorCrudo(ruta) as escritor:
+            for item in leer_registros(vigente):
+                escritor.escribir([item])
+
+    def _fusionar_json(self, datos, nombre):
+        """Actualiza por id el volcado JSON existente con los registros recibidos."""
+        ruta = self._ruta_crudo(nombre)
+        por_id = {}
+        if os.path.exists(ruta):
+            por_id = {item.get('id'): item for item in leer_registros(ruta)}
+        por_id.update((item.get('id'), item) for item in datos)
+        with EscritorCrudo(ruta) as escritor:
+            escritor.escribir(list(por_id.values()))
+        logger.info(f"JSON guardado: {os.path.basename(ruta)} ({escritor.total} registros)")
+
+    def _upsert(self, modelo, filas, al_guardar=None):
+        """Inserta o actualiza filas en lote con ``INSERT ... ON CONFLICT (id) DO UPDATE``.
+
+        Las filas cuyo contenido no cambió se omiten mediante ``IS DISTINCT FROM``,
+        por lo que una re-sincronización sin cambios no escribe nada. Si se pasa
+        ``al_guardar(db, ids)``, se llama en la misma transacción con los ids
+        insertados o actualizados.
+        Devuelve ``(insertados, actualizados, sin_cambios)``.
+        """
+        from sqlalchemy import literal_column, tuple_
+        from sqlalchemy.dialects.postgresql import insert
+        from db.database import sesion
+
+        tabla = modelo.__table__
+        # Un mismo id no puede aparecer dos veces en un INSERT ... ON CONFLICT
+        filas = list({fila['id']: fila for fila in filas if fila.get('id') is not None}.values())
+        if not filas:
+            return 0, 0, 0
+
+        columnas = [c for c in filas[0] if c != 'id']
+        insertados, actualizados = 0, 0
+        cambiados = []
+
+        with sesion() as db:
+            for i in range(0, len(filas), self.lote_db):
+                stmt = insert(tabla).values(filas[i:i + self.lote_db])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['id'],
+                    set_={c: stmt.excluded[c] for c in columnas},
+                    where=tuple_(*[tabla.c[c] for c in columnas]).is_distinct_from(
+                        tuple_(*[stmt.excluded[c] for c in columnas])
+                    ),
+                ).returning(tabla.c.id, literal_column('xmax = 0').label('insertado'))
+
+                for id_, insertado in db.execute(stmt):
+                    cambiados.append(id_)
+                    if insertado:
+                        insertados += 1
+                    else:
+                        actualizados += 1
+
+            if al_guardar and cambiados:
+                al_guardar(db, cambiados)
+
+        with self._lock_modificadas:
+            self.filas_modificadas += len(cambiados)
+
+        return insertados, actualizados, len(filas) - insertados - actualizados
 
     def _guardar_personajes(self, datos):
         """Guarda o actualiza personajes en la base de datos."""
         try:
-            from db.database import SessionLocal
             from db.models import Personaje
-
-            db = SessionLocal()
-            insertados, actualizados = 0, 0
-
-            for item in datos:
-                existente = db.query(Personaje).filter(Personaje.id == item['id']).first()
-                if existente:
-                    existente.name = item.get('name')
-                    existente.age = item.get('age')
-                    existente.gender = item.get('gender')
-                    existente.status = item.get('status')
-                    existente.occupation = item.get('occupation')
-                    existente.birthdate = item.get('birthdate')
-                    existente.portrait_path = item.get('portrait_path')
-                    existente.phrases = item.get('phrases', [])
-                    actualizados += 1
-                else:
-                    personaje = Personaje(
-                        id=item.get('id'),
-                        name=item.get('name'),
-                        age=item.get('age'),
-                        gender=item.get('gender'),
-                        status=item.get('status'),
-                        occupation=item.get('occupation'),
-                        birthdate=item.get('birthdate'),
-                        portrait_path=item.get('portrait_path'),
-                        phrases=item.get('phrases', []),
-                    )
-                    db.add(personaje)
-                    insertados += 1
-
-            db.commit()
-            db.close()
-            logger.info(f"Personajes DB: {insertados} insertados, {actualizados} actualizados")
+            from db.palabras import actualizar_palabras
+
+            filas = [{
+                'id': item.get('id'),
+                'name': item.get('name'),
+                'age': item.get('age'),
+                'gender': item.get('gender'),
+                'status': item.get('status'),
+                'occupation': item.get('occupation'),
+                'birthdate': item.get('birthdate'),
+                'portrait_path': item.get('portrait_path'),
+                'phrases': item.get('phrases', []),
+            } for item in datos]
+
+            insertados, actualizados, sin_cambios = self._upsert(
+                Personaje, filas, al_guardar=actualizar_palabras)
+            logger.info(f"Personajes DB: {insertados} insertados, {actualizados} actualizados, "
+                        f"{sin_cambios} sin cambios")
+            return True
 
         except Exception as e:
             logger.error(f"Error guardando personajes: {e}")
+            return False
 
     def _guardar_episodios(self, datos):
         """Guarda o actualiza episodios en la base de datos."""
         try:
-            from db.database import SessionLocal
             from db.models import Episodio
 
-            db = SessionLocal()
-            insertados, actualizados = 0, 0
-
-            for item in datos:
-                existente = db.query(Episodio).filter(Episodio.id == item['id']).first()
-                if existente:
-                    existente.name = item.get('name')
-                    existente.season = item.get('season')
-                    existente.episode_number = item.get('episode_number')
-                    existente.airdate = item.get('airdate')
-                    existente.synopsis = item.get('synopsis')
-                    existente.image_path = item.get('image_path')
-                    actualizados += 1
-                else:
-                    episodio = Episodio(
-                        id=item.get('id'),
-                        name=item.get('name'),
-                        season=item.get('season'),
-                        episode_number=item.get('episode_number'),
-                        airdate=item.get('airdate'),
-                        synopsis=item.get('synopsis'),
-                        image_path=item.get('image_path'),
-                    )
-                    db.add(episodio)
-                    insertados += 1
-
-            db.commit()
-            db.close()
-            logger.info(f"Episodios DB: {insertados} insertados, {actualizados} actualizados")
+            filas = [{
+                'id': item.get('id'),
+                'name': item.get('name'),
+                'season': item.get('season'),
+                'episode_number': item.get('episode_number'),
+                'airdate': item.get('airdate'),
+                'synopsis': item.get('synopsis'),
+                'image_path': item.get('image_path'),
+            } for item in datos]
+
+            insertados, actualizados, sin_cambios = self._upsert(Episodio, filas)
+            logger.info(f"Episodios DB: {insertados} insertados, {actualizados} actualizados, "
+                        f"{sin_cambios} sin cambios")
+            return True
 
         except Exception as e:
             logger.error(f"Error guardando episodios: {e}")
+            return False
 
     def _guardar_ubicaciones(self, datos):
         """Guarda o actualiza ubicaciones en la base de datos."""
         try:
-            from db.database import SessionLocal
             from db.models import Ubicacion
 
-            db = SessionLocal()
-            insertados, actualizados = 0, 0
-
-            for item in datos:
-                existente = db.query(Ubicacion).filter(Ubicacion.id == item['id']).first()
-                if existente:
-                    existente.name = item.get('name')
-                    existente.image_path = item.get('image_path')
-                    existente.town = item.get('town')
-                    existente.use = item.get('use')
-                    actualizados += 1
-                else:
-                    ubicacion = Ubicacion(
-                        id=item.get('id'),
-                        name=item.get('name'),
-                        image_path=item.get('image_path'),
-                        town=item.get('town'),
-                        use=item.get('use'),
-                    )
-                    db.add(ubicacion)
-                    insertados += 1
-
-            db.commit()
-            db.close()
-            logger.info(f"Ubicaciones DB: {insertados} insertados, {actualizados} actualizados")
+            filas = [{
+                'id': item.get('id'),
+                'name': item.get('name'),
+                'image_path': item.get('image_path'),
+                'town': item.get('town'),
+                'use': item.get('use'),
+            } for item in datos]
+
+            insertados, actualizados, sin_cambios = self._upsert(Ubicacion, filas)
+            logger.info(f"Ubicaciones DB: {insertados} insertados, {actualizados} actualizados, "
+                        f"{sin_cambios} sin cambios")
+            return True
 
         except Exception as e:
             logger.error(f"Error guardando ubicaciones: {e}")
+            return False
 
 
 if __name__ == "__main__":
@@ -219,8 +714,17 @@ if __name__ == "__main__":
         logger.info("Inicializando tablas de base de datos...")
         init_db()
 
+        parser = argparse.ArgumentParser(description="Extractor de The Simpsons API")
+        parser.add_argument('--incremental', action='store_true',
+                            default=os.getenv('EXTRACTOR_MODO', 'completo') == 'incremental',
+                            help="Solo descarga páginas desde el último checkpoint")
+        parser.add_argument('--imagenes', action='store_true',
+                            default=os.getenv('EXTRACTOR_PRECARGAR_IMAGENES', 'false').lower() == 'true',
+                            help="Precarga todas las imágenes y sus miniaturas en el almacén local")
+        args = parser.parse_args()
+
         extractor = SimpsonsExtractor()
-        extractor.ejecutar_extraccion()
+        extractor.ejecutar_extraccion(incremental=args.incremental, imagenes=args.imagenes)
 
     except Exception as e:
         logger.error(f"Error en extracción: {e}")
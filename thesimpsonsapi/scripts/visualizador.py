@@ -1,142 +1,265 @@
 #!/usr/bin/env python3
-import json
 import os
+import sys
+import queue
 import logging
 import tkinter as tk
 from tkinter import ttk
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageTk
-import requests
-from io import BytesIO
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from scripts.datos_crudos import buscar_crudo, cargar_registros
+from imagenes.cache import CacheImagenes
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-LIMIT_CHARACTERS = 20
+# Alto fijo de cada fila: permite calcular qué personajes son visibles sin medir widgets
+ROW_HEIGHT = 190
+ROW_PADDING = 10
+IMAGE_SIZE = 150
+# Filas extra construidas por encima y por debajo de la zona visible
+OVERSCAN = 2
+# Hilos que descargan y decodifican retratos
+IMAGE_WORKERS = int(os.getenv('VISUALIZADOR_WORKERS', '4'))
+# Retratos decodificados que se conservan en memoria (LRU)
+PHOTO_CACHE_SIZE = 300
+
+# Resultado de una descarga descartada porque la fila ya no estaba visible
+_OMITIDA = object()
+
+
+class _Fila:
+    """Widgets reutilizables de una fila de la lista virtualizada."""
+
+    def __init__(self, canvas):
+        self.character_id = None
+        self.portrait_path = None
+        self.card = tk.Frame(canvas, bg="white", relief=tk.RAISED, borderwidth=2, padx=15, pady=15)
+        self.window = canvas.create_window(0, 0, window=self.card, anchor="nw",
+                                           height=ROW_HEIGHT - ROW_PADDING)
+        self.card.pack_propagate(False)
+
+        # Imagen (lado izquierdo)
+        self.img_label = tk.Label(self.card, bg="#f0f0f0", width=IMAGE_SIZE, height=IMAGE_SIZE,
+                                  font=("Arial", 10), compound=tk.CENTER)
+        self.img_label.pack(side=tk.LEFT, padx=(0, 20))
+
+        # Datos (lado derecho)
+        data_frame = tk.Frame(self.card, bg="white")
+        data_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.id_label = tk.Label(data_frame, font=("Arial", 10), bg="white", fg="#666", anchor="w")
+        self.id_label.pack(fill=tk.X, pady=2)
+        self.name_label = tk.Label(data_frame, font=("Arial", 16, "bold"), bg="white", anchor="w")
+        self.name_label.pack(fill=tk.X, pady=5)
+        self.occupation_label = tk.Label(data_frame, font=("Arial", 11), bg="white", anchor="w",
+                                         wraplength=500, justify="left")
+        self.occupation_label.pack(fill=tk.X, pady=2)
+        self.birthdate_label = tk.Label(data_frame, font=("Arial", 11), bg="white", anchor="w")
+        self.birthdate_label.pack(fill=tk.X, pady=2)
+
 
 class SimpsonsViewer:
+    """Lista virtualizada del catálogo completo de personajes.
+
+    Solo existen widgets para las filas visibles (más ``OVERSCAN``), que se
+    reciclan al hacer scroll. Los retratos se descargan, decodifican y
+    redimensionan en hilos de fondo y se entregan al hilo de Tk por una cola,
+    así la ventana abre al instante sin importar el tamaño del catálogo.
+    """
+
     def __init__(self, root):
         self.root = root
         self.root.title("The Simpsons Characters Viewer")
         self.root.geometry("800x600")
-        
+
         # Directorio de datos
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        data_dir = os.path.join(script_dir, '..', 'data')
-        json_file = os.path.join(data_dir, 'simpsons_characters.json')
-        
+        data_dir = os.path.join(BASE_DIR, 'data')
+        json_file = buscar_crudo(data_dir, 'simpsons_characters')
+        if json_file is None:
+            raise FileNotFoundError(f"No hay volcado de personajes en {data_dir}. Ejecuta el extractor primero.")
+
         logger.info(f"Cargando datos desde {json_file}")
-        with open(json_file, 'r', encoding='utf-8') as f:
-            all_characters = json.load(f)
-        
-        # Aplicar límite
-        self.total_characters = len(all_characters)
-        self.characters = all_characters[:LIMIT_CHARACTERS]
-        logger.info(f"Cargados {self.total_characters} personajes (mostrando {len(self.characters)})")
-        
+        self.characters = cargar_registros(json_file)
+        logger.info(f"Cargados {len(self.characters)} personajes")
+
+        self.rows = {}                  # índice visible -> _Fila
+        self.free_rows = []             # filas recicladas
+        self.photos = OrderedDict()     # id -> PhotoImage (LRU)
+        self.pending = set()            # ids con retrato en proceso
+        self.failed = set()             # ids sin retrato disponible
+        self.visible_ids = set()
+        self.results = queue.Queue()
+        self.images = CacheImagenes()
+        self.executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS)
+
         # Configurar interfaz
         self.setup_ui()
-        
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.root.after(30, self.poll_images)
+
     def setup_ui(self):
         # Título
-        title = tk.Label(self.root, text="The Simpsons Characters", 
-                        font=("Arial", 20, "bold"), bg="#FFD90F", pady=10)
+        title = tk.Label(self.root, text="The Simpsons Characters",
+                         font=("Arial", 20, "bold"), bg="#FFD90F", pady=10)
         title.pack(fill=tk.X)
-        
+
+        # Contador
+        counter = tk.Label(self.root, text=f"{len(self.characters)} personajes",
+                           font=("Arial", 12, "bold"), bg="#87CEEB", pady=10)
+        counter.pack(fill=tk.X)
+
         # Frame con scroll
         main_frame = tk.Frame(self.root)
         main_frame.pack(fill=tk.BOTH, expand=1)
-        
-        # Canvas para scroll
-        canvas = tk.Canvas(main_frame, bg="#87CEEB")
-        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=1)
-        
+
+        # Canvas para scroll: su región tiene el alto de todo el catálogo
+        self.canvas = tk.Canvas(main_frame, bg="#87CEEB", highlightthickness=0)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=1)
+
         # Scrollbar
-        scrollbar = ttk.Scrollbar(main_frame, orient=tk.VERTICAL, command=canvas.yview)
+        scrollbar = ttk.Scrollbar(main_frame, orient=tk.VERTICAL, command=self.yview)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        canvas.configure(yscrollcommand=scrollbar.set)
-        canvas.bind('<Configure>', lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-        
-        # Frame para contenido
-        content_frame = tk.Frame(canvas, bg="#87CEEB")
-        canvas.create_window((0, 0), window=content_frame, anchor="nw")
-        
-        # Permitir scroll con rueda del mouse
-        def _on_mousewheel(event):
-            canvas.yview_scroll(int(-1*(event.delta/120)), "units")
-        canvas.bind_all("<MouseWheel>", _on_mousewheel)
-        
-        # Contador
-        counter_text = f"Mostrando {len(self.characters)} de {self.total_characters} personajes"
-        counter = tk.Label(content_frame, text=counter_text,
-                          font=("Arial", 12, "bold"), bg="#87CEEB", pady=10)
-        counter.pack()
-        
-        # Mostrar personajes
-        for character in self.characters:
-            self.create_character_card(content_frame, character)
-    
-    def create_character_card(self, parent, character):
-        # Frame para cada personaje
-        card = tk.Frame(parent, bg="white", relief=tk.RAISED, borderwidth=2, padx=15, pady=15)
-        card.pack(fill=tk.X, padx=20, pady=10)
-        
-        # Frame horizontal para imagen y datos
-        content = tk.Frame(card, bg="white")
-        content.pack(fill=tk.X)
-        
-        # Imagen (lado izquierdo)
-        img_frame = tk.Frame(content, bg="white")
-        img_frame.pack(side=tk.LEFT, padx=(0, 20))
-        
+
+        self.canvas.configure(yscrollcommand=scrollbar.set,
+                              yscrollincrement=ROW_HEIGHT // 4,
+                              scrollregion=(0, 0, 0, len(self.characters) * ROW_HEIGHT + ROW_PADDING))
+        self.canvas.bind('<Configure>', lambda e: self.update_visible_rows(resized=True))
+
+        # Permitir scroll con rueda del mouse (Windows/macOS y X11)
+        self.canvas.bind_all("<MouseWheel>", lambda e: self.yview("scroll", int(-1 * (e.delta / 120)), "units"))
+        self.canvas.bind_all("<Button-4>", lambda e: self.yview("scroll", -1, "units"))
+        self.canvas.bind_all("<Button-5>", lambda e: self.yview("scroll", 1, "units"))
+
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self.update_visible_rows()
+
+    def update_visible_rows(self, resized=False):
+        """Construye o recicla las filas que entran en la zona visible del canvas."""
+        if not self.characters:
+            return
+        top = self.canvas.canvasy(0)
+        height = self.canvas.winfo_height()
+        first = max(int(top // ROW_HEIGHT) - OVERSCAN, 0)
+        last = min(int((top + height) // ROW_HEIGHT) + OVERSCAN, len(self.characters) - 1)
+
+        for index in [i for i in self.rows if i < first or i > last]:
+            row = self.rows.pop(index)
+            self.canvas.itemconfigure(row.window, state='hidden')
+            self.free_rows.append(row)
+
+        # Antes de pedir retratos, para que los hilos no descarten los recién visibles
+        self.visible_ids = {self.characters[i].get('id') for i in range(first, last + 1)}
+        width = max(self.canvas.winfo_width() - 40, 200)
+        for index in range(first, last + 1):
+            row = self.rows.get(index)
+            if row is None:
+                row = self.free_rows.pop() if self.free_rows else _Fila(self.canvas)
+                self.fill_row(row, self.characters[index])
+                self.canvas.coords(row.window, 20, index * ROW_HEIGHT + ROW_PADDING)
+                self.canvas.itemconfigure(row.window, state='normal', width=width)
+                self.rows[index] = row
+            elif resized:
+                self.canvas.itemconfigure(row.window, width=width)
+
+    def fill_row(self, row, character):
+        """Vuelca los datos de ``character`` en una fila (nueva o reciclada)."""
+        row.character_id = character.get('id')
+        row.portrait_path = character.get('portrait_path')
+        row.id_label.configure(text=f"ID: {character.get('id')}")
+        row.name_label.configure(text=character.get('name') or "")
+        row.occupation_label.configure(text=f"Ocupación: {character.get('occupation')}")
+        birthdate = character.get('birthdate') or "Desconocida"
+        row.birthdate_label.configure(text=f"Fecha de nacimiento: {birthdate}")
+
+        photo = self.photos.get(row.character_id)
+        if photo is not None:
+            self.photos.move_to_end(row.character_id)
+            self.show_photo(row, photo)
+        elif row.character_id in self.failed or not row.portrait_path:
+            self.show_placeholder(row, "Imagen no\ndisponible")
+        else:
+            self.show_placeholder(row, "Cargando...")
+            self.request_portrait(row.character_id, row.portrait_path)
+
+    @staticmethod
+    def show_photo(row, photo):
+        row.img_label.configure(image=photo, text="", width=IMAGE_SIZE, height=IMAGE_SIZE)
+        row.img_label.image = photo  # Mantener referencia
+
+    @staticmethod
+    def show_placeholder(row, text):
+        # Imagen vacía de 1x1 para que width/height sigan en píxeles
+        blank = getattr(row.img_label, 'blank', None) or tk.PhotoImage(width=1, height=1)
+        row.img_label.blank = blank
+        row.img_label.configure(image=blank, text=text, width=IMAGE_SIZE, height=IMAGE_SIZE)
+        row.img_label.image = blank
+
+    def request_portrait(self, character_id, portrait_path):
+        if character_id in self.pending:
+            return
+        self.pending.add(character_id)
+        self.executor.submit(self._load_portrait, character_id, portrait_path)
+
+    def _load_portrait(self, character_id, portrait_path):
+        """Hilo de fondo: obtiene el retrato (caché en disco o CDN) y lo deja listo para Tk."""
+        if character_id not in self.visible_ids:
+            self.results.put((character_id, _OMITIDA))
+            return
         try:
-            # Descargar imagen
-            img_url = f"https://cdn.thesimpsonsapi.com/500{character['portrait_path']}"
-            response = requests.get(img_url, timeout=5)
-            response.raise_for_status()
-            
-            # Procesar imagen
-            img_data = Image.open(BytesIO(response.content))
-            img_data = img_data.resize((150, 150), Image.Resampling.LANCZOS)
-            photo = ImageTk.PhotoImage(img_data)
-            
-            img_label = tk.Label(img_frame, image=photo, bg="white")
-            img_label.image = photo  # Mantener referencia
-            img_label.pack()
+            ruta = self.images.ruta(portrait_path, 'pequena')
+            if ruta is None:
+                self.results.put((character_id, None))
+                return
+            with Image.open(ruta) as img:
+                img = img.convert('RGBA').resize((IMAGE_SIZE, IMAGE_SIZE), Image.Resampling.LANCZOS)
+            self.results.put((character_id, img))
         except Exception as e:
-            logger.warning(f"Error cargando imagen para {character['name']}: {e}")
-            placeholder = tk.Label(img_frame, text="\nImagen no\ndisponible", 
-                                  bg="#f0f0f0", width=20, height=8, 
-                                  font=("Arial", 10))
-            placeholder.pack()
-        
-        # Datos (lado derecho)
-        data_frame = tk.Frame(content, bg="white")
-        data_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        
-        # ID
-        id_label = tk.Label(data_frame, text=f"ID: {character['id']}", 
-                           font=("Arial", 10), bg="white", fg="#666", anchor="w")
-        id_label.pack(fill=tk.X, pady=2)
-        
-        # Nombre
-        name_label = tk.Label(data_frame, text=character['name'], 
-                             font=("Arial", 16, "bold"), bg="white", anchor="w")
-        name_label.pack(fill=tk.X, pady=5)
-        
-        # Ocupación
-        occupation_label = tk.Label(data_frame, 
-                                   text=f"Ocupación: {character['occupation']}", 
-                                   font=("Arial", 11), bg="white", anchor="w", 
-                                   wraplength=500, justify="left")
-        occupation_label.pack(fill=tk.X, pady=2)
-        
-        # Fecha de nacimiento
-        birthdate = character['birthdate'] if character['birthdate'] else "Desconocida"
-        birthdate_label = tk.Label(data_frame, 
-                                  text=f"Fecha de nacimiento: {birthdate}", 
-                                  font=("Arial", 11), bg="white", anchor="w")
-        birthdate_label.pack(fill=tk.X, pady=2)
+            logger.warning(f"Error cargando imagen del personaje {character_id}: {e}")
+            self.results.put((character_id, None))
+
+    def poll_images(self):
+        """Hilo de Tk: convierte los retratos listos en PhotoImage y actualiza sus filas."""
+        try:
+            while True:
+                character_id, img = self.results.get_nowait()
+                self.pending.discard(character_id)
+                if img is _OMITIDA:
+                    continue
+                if img is None:
+                    self.failed.add(character_id)
+                    photo = None
+                else:
+                    photo = ImageTk.PhotoImage(img)
+                    self.photos[character_id] = photo
+                    if len(self.photos) > PHOTO_CACHE_SIZE:
+                        self.photos.popitem(last=False)
+                for row in self.rows.values():
+                    if row.character_id == character_id:
+                        if photo is None:
+                            self.show_placeholder(row, "Imagen no\ndisponible")
+                        else:
+                            self.show_photo(row, photo)
+        except queue.Empty:
+            pass
+
+        # Las filas que quedaron visibles tras descartar su descarga la vuelven a pedir
+        for row in self.rows.values():
+            if (row.portrait_path and row.character_id not in self.photos
+                    and row.character_id not in self.failed and row.character_id not in self.pending):
+                self.request_portrait(row.character_id, row.portrait_path)
+        self.root.after(30, self.poll_images)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
+
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -1,7 +1,7 @@
 import os
 import sys
 import base64
-import requests as http_requests
+import hashlib
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if BASE_DIR not in sys.path:
@@ -12,15 +12,22 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from dotenv import load_dotenv
-from db.database import SessionLocal
+from sqlalchemy import select
+from db.database import conexion, estadisticas_pool
 from db.models import Personaje, Episodio, Ubicacion
+from db.consultas import (buscar_personajes, buscar_texto, nombres_personajes, obtener_personaje,
+                          palabras_personaje)
+from db.vistas import leer_vista
+from db.version import leer_version
+from imagenes.cache import CacheImagenes
 
 load_dotenv(os.path.join(BASE_DIR, '.env'))
 
-IMAGE_BASE_URL = "https://cdn.thesimpsonsapi.com/500"
-LOGO_PATH   = os.path.join(os.path.dirname(__file__), "img", "logo.webp")
-HERO_PATH   = os.path.join(os.path.dirname(__file__), "img", "hero.webp")
-CLOUDS_PATH = os.path.join(os.path.dirname(__file__), "img", "clouds-bg.jpg")
+# Archivos servidos por Streamlit en app/static/ (server.enableStaticServing)
+STATIC_DIR  = os.path.join(os.path.dirname(__file__), "static")
+LOGO_PATH   = os.path.join(STATIC_DIR, "logo.webp")
+HERO_PATH   = os.path.join(STATIC_DIR, "hero.webp")
+CLOUDS_PATH = os.path.join(STATIC_DIR, "clouds-bg.jpg")
 CSS_PATH    = os.path.join(os.path.dirname(__file__), "styles.css")
 
 # ── Paleta de colores Simpsons ───────────────────────────────────────────────
@@ -37,12 +44,76 @@ PLOTLY_LAYOUT = dict(
     transition=dict(duration=500, easing="cubic-in-out"),
 )
 
+# Columnas de la tabla de personajes: atributo del modelo -> encabezado
+COLUMNAS_PERSONAJES = {
+    'id': 'ID',
+    'name': 'Nombre',
+    'age': 'Edad',
+    'gender': 'Genero',
+    'status': 'Estado',
+    'occupation': 'Ocupacion',
+    'birthdate': 'Fecha de nacimiento',
+    'portrait_path': 'Retrato',
+    'phrases': 'Frases',
+}
+# Filas por lote al cargar las tablas completas
+LOTE_CARGA = int(os.getenv('APP_LOTE_CARGA', '2000'))
+# Segundos entre consultas de la versión de los datos publicada por el extractor
+VERSION_TTL = int(os.getenv('APP_VERSION_TTL', '30'))
+
+COLUMNAS_ORDEN = {'ID': 'id', 'Nombre': 'name', 'Genero': 'gender', 'Edad': 'age',
+                  'Ocupacion': 'occupation', 'Estado': 'status'}
+
 AXIS_STYLE = dict(tickfont=dict(color="#1A2E3B"), title_font=dict(color="#1A2E3B"), gridcolor="rgba(184,223,244,0.4)")
 
 
-def load_css(path: str) -> None:
+@st.cache_resource
+def cache_imagenes() -> CacheImagenes:
+    return CacheImagenes()
+
+
+def imagen_b64(path, tamano: str = "mediana", timeout: int = 10):
+    """Miniatura en base64 servida desde la cache local de imagenes (None si no hay)."""
+    if not isinstance(path, str) or not path:
+        return None
+    contenido = cache_imagenes().obtener(path, tamano, timeout)
+    return base64.b64encode(contenido).decode() if contenido else None
+
+
+def imagenes_b64(paths, tamano: str = "mediana", timeout: int = 10) -> dict:
+    """Miniaturas en base64 de varias imagenes, obtenidas en paralelo: {path: b64 | None}."""
+    paths = [p for p in paths if isinstance(p, str) and p]
+    contenidos = cache_imagenes().obtener_varias(paths, tamano, timeout)
+    return {p: base64.b64encode(c).decode() if c else None for p, c in contenidos.items()}
+
+
+def reiniciar_pagina_personajes() -> None:
+    """Vuelve a la primera pagina al cambiar la busqueda o el orden."""
+    st.session_state["page_char"] = 1
+
+
+@st.cache_resource
+def url_estatico(path: str):
+    """URL de un archivo de ``STATIC_DIR`` con la huella de su contenido (None si no existe).
+
+    El parámetro ``v`` cambia solo cuando cambia el archivo, así el navegador
+    puede guardarlo en caché indefinidamente.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        huella = hashlib.sha1(f.read()).hexdigest()[:12]
+    return f"app/static/{os.path.basename(path)}?v={huella}"
+
+
+@st.cache_resource
+def leer_css(path: str) -> str:
     with open(path, "r", encoding="utf-8") as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+        return f.read()
+
+
+def load_css(path: str) -> None:
+    st.markdown(f"<style>{leer_css(path)}</style>", unsafe_allow_html=True)
 
 
 st.set_page_config(
@@ -53,11 +124,8 @@ st.set_page_config(
 )
 
 # ── Fondo dinamico ───────────────────────────────────────────────────────────
-_clouds_css = ""
-if os.path.exists(CLOUDS_PATH):
-    with open(CLOUDS_PATH, "rb") as _f:
-        _clouds_b64 = base64.b64encode(_f.read()).decode()
-    _clouds_css = f'url("data:image/jpeg;base64,{_clouds_b64}")'
+_clouds_url = url_estatico(CLOUDS_PATH)
+_clouds_css = f'url("{_clouds_url}")' if _clouds_url else "none"
 
 st.markdown(f"""
 <style>
@@ -78,72 +146,103 @@ load_css(CSS_PATH)
 # ═══════════════════════════════════════════════════════════════════════════════
 # CARGA DE DATOS
 # ═══════════════════════════════════════════════════════════════════════════════
-@st.cache_data
-def cargar_personajes():
-    db = SessionLocal()
-    try:
-        personajes = db.query(Personaje).all()
-        return pd.DataFrame([{
-            'ID': p.id,
-            'Nombre': p.name,
-            'Edad': p.age,
-            'Genero': p.gender,
-            'Estado': p.status,
-            'Ocupacion': p.occupation,
-            'Fecha de nacimiento': p.birthdate,
-            'Retrato': p.portrait_path,
-            'Frases': p.phrases or [],
-        } for p in personajes])
-    finally:
-        db.close()
-
-
-@st.cache_data
-def cargar_episodios():
-    db = SessionLocal()
-    try:
-        episodios = db.query(Episodio).all()
-        return pd.DataFrame([{
-            'ID': e.id,
-            'Nombre': e.name,
-            'Temporada': e.season,
-            'Episodio': e.episode_number,
-            'Fecha': e.airdate,
-            'Sinopsis': e.synopsis,
-            'Imagen': e.image_path,
-        } for e in episodios])
-    finally:
-        db.close()
-
-
-@st.cache_data
-def cargar_ubicaciones():
-    db = SessionLocal()
-    try:
-        ubicaciones = db.query(Ubicacion).all()
-        return pd.DataFrame([{
-            'ID': u.id,
-            'Nombre': u.name,
-            'Imagen': u.image_path,
-            'Ciudad': u.town,
-            'Uso': u.use,
-        } for u in ubicaciones])
-    finally:
-        db.close()
-
-
-df_personajes = cargar_personajes()
-df_episodios = cargar_episodios()
-df_ubicaciones = cargar_ubicaciones()
+def cargar_columnas(modelo, columnas: dict, tipos: dict) -> pd.DataFrame:
+    """DataFrame con solo ``columnas`` (atributo -> encabezado) de ``modelo``.
+
+    Las filas se leen con un cursor del servidor en lotes de ``LOTE_CARGA`` y se
+    tipan por lote, sin instanciar objetos ORM. Las columnas ``category`` se
+    convierten al final para que todos los lotes compartan las mismas categorías.
+    """
+    categoricas = [c for c, t in tipos.items() if t == 'category']
+    tipos_lote = {c: t for c, t in tipos.items() if t != 'category'}
+    consulta = select(*[getattr(modelo, c) for c in columnas]).order_by(modelo.id)
+
+    lotes = []
+    with conexion() as conn:
+        resultado = conn.execution_options(stream_results=True, yield_per=LOTE_CARGA).execute(consulta)
+        for filas in resultado.partitions():
+            lotes.append(pd.DataFrame.from_records(filas, columns=list(columnas.values())).astype(tipos_lote))
+
+    if not lotes:
+        return pd.DataFrame(columns=list(columnas.values())).astype(tipos)
+    df = pd.concat(lotes, ignore_index=True) if len(lotes) > 1 else lotes[0]
+    return df.astype({c: 'category' for c in categoricas})
+
+
+@st.cache_data(max_entries=2)
+def cargar_personajes(version: int):
+    df = cargar_columnas(Personaje, COLUMNAS_PERSONAJES, {
+        'ID': 'int32',
+        # float32 y no Int16: el radar opera con NaN y max() de Python
+        'Edad': 'float32',
+        'Genero': 'category',
+        'Estado': 'category',
+    })
+    df['Frases'] = df['Frases'].map(lambda x: x or [])
+    return df
+
+
+@st.cache_data(max_entries=2)
+def cargar_episodios(version: int):
+    return cargar_columnas(Episodio, {
+        'id': 'ID',
+        'name': 'Nombre',
+        'season': 'Temporada',
+        'episode_number': 'Episodio',
+        'airdate': 'Fecha',
+        'synopsis': 'Sinopsis',
+        'image_path': 'Imagen',
+    }, {'ID': 'int32', 'Temporada': 'Int16', 'Episodio': 'Int16'})
+
+
+@st.cache_data(max_entries=2)
+def cargar_ubicaciones(version: int):
+    return cargar_columnas(Ubicacion, {
+        'id': 'ID',
+        'name': 'Nombre',
+        'image_path': 'Imagen',
+        'town': 'Ciudad',
+        'use': 'Uso',
+    }, {'ID': 'int32', 'Ciudad': 'category', 'Uso': 'category'})
+
+
+@st.cache_data(max_entries=32)
+def cargar_agregado(nombre: str, version: int) -> pd.DataFrame:
+    """Agregado precalculado (vista materializada mv_<nombre>) con columnas capitalizadas."""
+    columnas, filas = leer_vista(nombre)
+    # Columnas explícitas: una vista vacía da un DataFrame vacío pero con sus columnas
+    return pd.DataFrame.from_records(filas, columns=columnas).rename(columns=str.capitalize)
+
+
+@st.cache_data(max_entries=64)
+def cargar_nombres(texto: str, version: int) -> dict:
+    """(id -> nombre) de los personajes que coinciden con la búsqueda, para el selector."""
+    return {c['id']: c['name'] for c in nombres_personajes(texto)}
+
+
+@st.cache_data(ttl=VERSION_TTL)
+def version_datos() -> int:
+    """Versión de los datos en PostgreSQL; es parte de la clave de caché de los cargar_*."""
+    return leer_version()
+
+
+# Cuando el extractor publica una versión nueva las cargas se recalculan una vez;
+# mientras no cambie, solo se consulta la versión cada VERSION_TTL segundos.
+version = version_datos()
+df_personajes = cargar_personajes(version)
+df_episodios = cargar_episodios(version)
+df_ubicaciones = cargar_ubicaciones(version)
+
+with st.sidebar.expander("Diagnostico de conexiones"):
+    st.json(estadisticas_pool())
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # HEADER
 # ═══════════════════════════════════════════════════════════════════════════════
 hero_html = ""
-if os.path.exists(HERO_PATH):
-    with open(HERO_PATH, "rb") as f:
-        hero_b64 = base64.b64encode(f.read()).decode()
-    hero_html = f'<img src="data:image/webp;base64,{hero_b64}" alt="The Simpsons API"/>'
+hero_url = url_estatico(HERO_PATH)
+if hero_url:
+    hero_html = f'<img src="{hero_url}" alt="The Simpsons API"/>'
 
 st.markdown(f"""
 <div class="hero-block">
@@ -157,12 +256,15 @@ st.markdown(f"""
 # METRICAS
 # ═══════════════════════════════════════════════════════════════════════════════
 c1, c2, c3, c4, c5 = st.columns(5)
+df_resumen = cargar_agregado('resumen', version)
+# Vista aún sin datos: métricas en cero
+resumen = df_resumen.iloc[0] if not df_resumen.empty else pd.Series(0, index=df_resumen.columns)
 metrics = [
-    ("Personajes",  len(df_personajes)),
-    ("Episodios",   len(df_episodios)),
-    ("Ubicaciones", len(df_ubicaciones)),
-    ("Temporadas",  int(df_episodios['Temporada'].nunique()) if not df_episodios.empty else 0),
-    ("Ciudades",    int(df_ubicaciones['Ciudad'].nunique()) if not df_ubicaciones.empty else 0),
+    ("Personajes",  int(resumen['Personajes'])),
+    ("Episodios",   int(resumen['Episodios'])),
+    ("Ubicaciones", int(resumen['Ubicaciones'])),
+    ("Temporadas",  int(resumen['Temporadas'])),
+    ("Ciudades",    int(resumen['Ciudades'])),
 ]
 for col, (label, value) in zip([c1, c2, c3, c4, c5], metrics):
     with col:
@@ -175,6 +277,40 @@ for col, (label, value) in zip([c1, c2, c3, c4, c5], metrics):
 
 st.markdown('<div class="section-sep"></div>', unsafe_allow_html=True)
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# BUSQUEDA DE TEXTO COMPLETO
+# ═══════════════════════════════════════════════════════════════════════════════
+busqueda_global = st.text_input(
+    label="busqueda_global",
+    placeholder="Buscar en nombres, ocupaciones, frases y sinopsis...",
+    label_visibility="collapsed",
+    key="search_global"
+)
+if busqueda_global:
+    resultados = buscar_texto(busqueda_global)
+    rb1, rb2 = st.columns(2)
+    with rb1:
+        st.markdown('<p class="section-label">Personajes</p>', unsafe_allow_html=True)
+        if resultados['personajes']:
+            cards = "".join(
+                f'<span class="same-occ-card">{r["name"]}{" &middot; " + r["occupation"] if r["occupation"] else ""}</span>'
+                for r in resultados['personajes']
+            )
+            st.markdown(f'<div class="phrases-container">{cards}</div>', unsafe_allow_html=True)
+        else:
+            st.info("Sin personajes para esta busqueda")
+    with rb2:
+        st.markdown('<p class="section-label">Episodios</p>', unsafe_allow_html=True)
+        if resultados['episodios']:
+            cards = "".join(
+                f'<span class="same-occ-card">S{r["season"] or 0:02d}E{r["episode_number"] or 0:02d} — {r["name"]}</span>'
+                for r in resultados['episodios']
+            )
+            st.markdown(f'<div class="phrases-container">{cards}</div>', unsafe_allow_html=True)
+        else:
+            st.info("Sin episodios para esta busqueda")
+    st.markdown('<div class="section-sep"></div>', unsafe_allow_html=True)
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # TABS
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -196,28 +332,46 @@ with tab_personajes:
             label="busqueda",
             placeholder="Buscar por nombre u ocupacion...",
             label_visibility="collapsed",
-            key="search_char"
+            key="search_char",
+            on_change=reiniciar_pagina_personajes,
         )
 
-        df_filtrado = df_personajes.copy()
-        if busqueda:
-            mask = (
-                df_personajes['Nombre'].str.contains(busqueda, case=False, na=False) |
-                df_personajes['Ocupacion'].str.contains(busqueda, case=False, na=False)
+        co1, co2, co3 = st.columns([2, 1, 1])
+        with co1:
+            orden_label = st.selectbox("Ordenar por", list(COLUMNAS_ORDEN), key="sort_char",
+                                       on_change=reiniciar_pagina_personajes)
+        with co2:
+            direccion = st.selectbox("Direccion", ["Ascendente", "Descendente"], key="dir_char",
+                                     on_change=reiniciar_pagina_personajes)
+        with co3:
+            tamano_pagina = st.selectbox("Filas por pagina", [25, 50, 100], key="size_char",
+                                         on_change=reiniciar_pagina_personajes)
+
+        pagina = st.session_state.get("page_char", 1)
+        filas, total = buscar_personajes(
+            busqueda, COLUMNAS_ORDEN[orden_label], direccion == "Descendente", pagina, tamano_pagina
+        )
+        total_paginas = max(1, -(-total // tamano_pagina))
+        if pagina > total_paginas:
+            pagina = st.session_state["page_char"] = total_paginas
+            filas, total = buscar_personajes(
+                busqueda, COLUMNAS_ORDEN[orden_label], direccion == "Descendente", pagina, tamano_pagina
             )
-            df_filtrado = df_personajes[mask]
+        df_filtrado = pd.DataFrame(filas, columns=list(COLUMNAS_PERSONAJES)).rename(columns=COLUMNAS_PERSONAJES)
+        df_filtrado['Frases'] = df_filtrado['Frases'].apply(lambda x: x or [])
 
         st.markdown(
-            f'<span class="results-badge">{len(df_filtrado)} resultado{"s" if len(df_filtrado) != 1 else ""}</span>',
+            f'<span class="results-badge">{total} resultado{"s" if total != 1 else ""}'
+            f' &middot; pagina {pagina} de {total_paginas}</span>',
             unsafe_allow_html=True
         )
 
-        # Tabla
+        # Tabla (solo la pagina visible)
         cols_tabla = ['ID', 'Nombre', 'Genero', 'Edad', 'Ocupacion', 'Estado']
-        filas_html = ""
-        for _, row in df_filtrado[cols_tabla].iterrows():
-            celdas = "".join(f"<td>{'' if pd.isna(v) else v}</td>" for v in row)
-            filas_html += f"<tr>{celdas}</tr>"
+        filas_html = "".join(
+            "<tr>" + "".join(f"<td>{'' if pd.isna(v) else v}</td>" for v in row) + "</tr>"
+            for row in df_filtrado[cols_tabla].itertuples(index=False)
+        )
         encabezados = "".join(f"<th>{c}</th>" for c in cols_tabla)
 
         st.markdown(f"""
@@ -229,40 +383,38 @@ with tab_personajes:
         </div>
         """, unsafe_allow_html=True)
 
+        st.number_input("Pagina", min_value=1, max_value=total_paginas, step=1, key="page_char")
+
         st.markdown('<div class="section-sep"></div>', unsafe_allow_html=True)
 
         # ── Detalle de personaje con graficos ───────────────────────────────
         st.markdown('<p class="section-label">Detalle de personaje</p>', unsafe_allow_html=True)
 
-        nombres = df_filtrado['Nombre'].dropna().sort_values().tolist()
+        # Todas las coincidencias de la busqueda, no solo la pagina visible
+        nombres = cargar_nombres(busqueda, version)
         if nombres:
-            seleccionado = st.selectbox(
+            seleccionado_id = st.selectbox(
                 label="personaje",
-                options=nombres,
+                options=list(nombres),
+                format_func=nombres.get,
                 label_visibility="collapsed",
                 key="select_char"
             )
-            fila = df_filtrado[df_filtrado['Nombre'] == seleccionado].iloc[0]
+            fila = pd.Series(obtener_personaje(seleccionado_id)).rename(COLUMNAS_PERSONAJES)
+            fila['Frases'] = fila['Frases'] or []
+            seleccionado = fila['Nombre']
 
             # ── Portrait + Info ──
             col_img, col_info = st.columns([1, 2], gap="large")
 
             with col_img:
-                if pd.notna(fila['Retrato']) and fila['Retrato']:
-                    portrait_url = fila['Retrato']
-                    if portrait_url.startswith('/'):
-                        portrait_url = IMAGE_BASE_URL + portrait_url
-                    try:
-                        resp = http_requests.get(portrait_url, timeout=10)
-                        resp.raise_for_status()
-                        img_b64 = base64.b64encode(resp.content).decode()
-                        st.markdown(f"""
-                        <div class="portrait-wrap">
-                            <img src="data:image/webp;base64,{img_b64}" alt="{seleccionado}"/>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    except Exception:
-                        st.markdown('<div class="portrait-wrap"><p style="color:var(--muted)">Sin imagen</p></div>', unsafe_allow_html=True)
+                img_b64 = imagen_b64(fila['Retrato'], "mediana")
+                if img_b64:
+                    st.markdown(f"""
+                    <div class="portrait-wrap">
+                        <img src="data:image/webp;base64,{img_b64}" alt="{seleccionado}"/>
+                    </div>
+                    """, unsafe_allow_html=True)
                 else:
                     st.markdown('<div class="portrait-wrap"><p style="color:var(--muted)">Sin imagen</p></div>', unsafe_allow_html=True)
 
@@ -307,23 +459,8 @@ with tab_personajes:
             with g1:
                 frases_list = fila['Frases'] if isinstance(fila['Frases'], list) else []
                 if frases_list:
-                    import re
-                    stop_words = {'the','a','an','is','are','was','were','be','been','being',
-                                  'have','has','had','do','does','did','will','would','could',
-                                  'should','may','might','shall','can','need','dare','ought',
-                                  'i','me','my','you','your','he','him','his','she','her','it',
-                                  'its','we','our','they','them','their','what','which','who',
-                                  'this','that','these','those','am','to','of','in','for','on',
-                                  'with','at','by','from','as','into','about','like','after',
-                                  'between','out','against','during','without','before','above',
-                                  'below','up','down','and','but','or','nor','not','so','very',
-                                  'just','than','too','also','if','then','all','no','dont','im',
-                                  'oh','get','got','go','going','thats','youre','well','let'}
-                    all_words = ' '.join(frases_list).lower()
-                    all_words = re.sub(r'[^a-z\s]', '', all_words)
-                    words = [w for w in all_words.split() if w not in stop_words and len(w) > 2]
-                    if words:
-                        word_freq = pd.Series(words).value_counts().head(10).reset_index()
+                    word_freq = pd.DataFrame(palabras_personaje(int(fila['ID'])), columns=['token', 'cantidad'])
+                    if not word_freq.empty:
                         word_freq.columns = ['Palabra', 'Frecuencia']
                         word_freq = word_freq.sort_values('Frecuencia', ascending=True)
                         fig_words = go.Figure(go.Bar(
@@ -387,8 +524,7 @@ with tab_personajes:
 
             # --- Distribucion de genero (donut) ---
             with g2:
-                genero_counts = df_personajes['Genero'].dropna().value_counts().reset_index()
-                genero_counts.columns = ['Genero', 'Cantidad']
+                genero_counts = cargar_agregado('genero', version)
                 # Highlight del personaje seleccionado
                 pull_vals = [0.1 if g == fila['Genero'] else 0 for g in genero_counts['Genero']]
                 fig_gender = go.Figure(go.Pie(
@@ -412,8 +548,7 @@ with tab_personajes:
 
             # --- Top ocupaciones ---
             with g3:
-                occ_counts = df_personajes['Ocupacion'].dropna().value_counts().head(15).reset_index()
-                occ_counts.columns = ['Ocupacion', 'Cantidad']
+                occ_counts = cargar_agregado('ocupacion', version).head(15)
                 colors = ['#FED90F' if o == fila['Ocupacion'] else '#29ABE2' for o in occ_counts['Ocupacion']]
                 fig_occ = go.Figure(go.Bar(
                     y=occ_counts['Ocupacion'],
@@ -434,8 +569,7 @@ with tab_personajes:
 
             # --- Estado vivo/muerto ---
             with g4:
-                status_counts = df_personajes['Estado'].dropna().value_counts().reset_index()
-                status_counts.columns = ['Estado', 'Cantidad']
+                status_counts = cargar_agregado('estado', version)
                 pull_status = [0.1 if s == fila['Estado'] else 0 for s in status_counts['Estado']]
                 color_map = {'Alive': '#4CAF50', 'Deceased': '#E91E63'}
                 status_colors = [color_map.get(s, '#5E8DA6') for s in status_counts['Estado']]
@@ -485,7 +619,7 @@ with tab_episodios:
 
         # --- Episodios por temporada ---
         with ge1:
-            eps_per_season = df_episodios.groupby('Temporada').size().reset_index(name='Episodios')
+            eps_per_season = cargar_agregado('temporada', version)
             fig_eps = px.bar(
                 eps_per_season, x='Temporada', y='Episodios',
                 color='Episodios',
@@ -505,11 +639,8 @@ with tab_episodios:
 
         # --- Timeline de temporadas por ano ---
         with ge2:
-            df_ep_dates = df_episodios[df_episodios['Fecha'].notna()].copy()
-            if not df_ep_dates.empty:
-                df_ep_dates['Ano'] = pd.to_datetime(df_ep_dates['Fecha'], errors='coerce').dt.year
-                eps_per_year = df_ep_dates.groupby('Ano').size().reset_index(name='Episodios')
-                eps_per_year = eps_per_year.dropna()
+            eps_per_year = cargar_agregado('ano', version)
+            if not eps_per_year.empty:
                 fig_timeline = px.area(
                     eps_per_year, x='Ano', y='Episodios',
                     color_discrete_sequence=['#29ABE2'],
@@ -544,24 +675,22 @@ with tab_episodios:
             unsafe_allow_html=True
         )
 
+        # Precarga en paralelo de las imagenes de la temporada
+        imagenes_ep = imagenes_b64(df_ep_filt['Imagen'], "mediana")
+
         for _, ep in df_ep_filt.iterrows():
             with st.container():
                 ce1, ce2 = st.columns([1, 3])
                 with ce1:
                     if pd.notna(ep['Imagen']) and ep['Imagen']:
-                        img_url = ep['Imagen']
-                        if img_url.startswith('/'):
-                            img_url = IMAGE_BASE_URL + img_url
-                        try:
-                            resp = http_requests.get(img_url, timeout=10)
-                            resp.raise_for_status()
-                            ep_img_b64 = base64.b64encode(resp.content).decode()
+                        ep_img_b64 = imagenes_ep.get(ep['Imagen'])
+                        if ep_img_b64:
                             st.markdown(f"""
                             <div class="portrait-wrap">
                                 <img src="data:image/webp;base64,{ep_img_b64}" alt="{ep['Nombre']}" style="border-radius:8px;"/>
                             </div>
                             """, unsafe_allow_html=True)
-                        except Exception:
+                        else:
                             st.markdown('<div class="portrait-wrap"><p style="color:var(--muted)">Sin imagen</p></div>', unsafe_allow_html=True)
                 with ce2:
                     st.markdown(f"""
@@ -587,10 +716,10 @@ with tab_ubicaciones:
 
         # --- Treemap por uso y ciudad ---
         with gu1:
-            df_tree = df_ubicaciones[df_ubicaciones['Uso'].notna() & df_ubicaciones['Ciudad'].notna()].copy()
+            df_tree = cargar_agregado('uso_ciudad', version)
             if not df_tree.empty:
                 fig_tree = px.treemap(
-                    df_tree, path=['Uso', 'Ciudad'], color='Uso',
+                    df_tree, path=['Uso', 'Ciudad'], values='Cantidad', color='Uso',
                     color_discrete_sequence=SIMPSONS_COLORS,
                 )
                 fig_tree.update_layout(
@@ -606,8 +735,7 @@ with tab_ubicaciones:
 
         # --- Ubicaciones por ciudad ---
         with gu2:
-            town_counts = df_ubicaciones['Ciudad'].dropna().value_counts().head(15).reset_index()
-            town_counts.columns = ['Ciudad', 'Cantidad']
+            town_counts = cargar_agregado('ciudad', version).head(15)
             fig_towns = go.Figure(go.Bar(
                 y=town_counts['Ciudad'],
                 x=town_counts['Cantidad'],
@@ -655,23 +783,16 @@ with tab_ubicaciones:
 
         # Grid de ubicaciones (4 columnas)
         cols_per_row = 4
-        rows = [df_ub_filt.iloc[i:i+cols_per_row] for i in range(0, min(len(df_ub_filt), 40), cols_per_row)]
+        df_ub_vis = df_ub_filt.head(40)
+        imagenes_ub = imagenes_b64(df_ub_vis['Imagen'], "pequena", timeout=8)
+        rows = [df_ub_vis.iloc[i:i+cols_per_row] for i in range(0, len(df_ub_vis), cols_per_row)]
         for row_data in rows:
             cols = st.columns(cols_per_row)
             for idx, (_, ub) in enumerate(row_data.iterrows()):
                 with cols[idx]:
-                    img_html = ""
-                    if pd.notna(ub['Imagen']) and ub['Imagen']:
-                        ub_img_url = ub['Imagen']
-                        if ub_img_url.startswith('/'):
-                            ub_img_url = IMAGE_BASE_URL + ub_img_url
-                        try:
-                            resp = http_requests.get(ub_img_url, timeout=8)
-                            resp.raise_for_status()
-                            ub_img_b64 = base64.b64encode(resp.content).decode()
-                            img_html = f'<img src="data:image/webp;base64,{ub_img_b64}" alt="{ub["Nombre"]}"/>'
-                        except Exception:
-                            img_html = '<div style="height:100px;display:flex;align-items:center;justify-content:center;color:var(--muted);font-size:0.75rem;">Sin imagen</div>'
+                    ub_img_b64 = imagenes_ub.get(ub['Imagen'])
+                    if ub_img_b64:
+                        img_html = f'<img src="data:image/webp;base64,{ub_img_b64}" alt="{ub["Nombre"]}"/>'
                     else:
                         img_html = '<div style="height:100px;display:flex;align-items:center;justify-content:center;color:var(--muted);font-size:0.75rem;">Sin imagen</div>'
 
@@ -679,6 +800,6 @@ with tab_ubicaciones:
                     <div class="location-card">
                         {img_html}
                         <div class="location-name">{ub['Nombre']}</div>
-                        <div class="location-meta">{ub['Ciudad'] or ''} &middot; {ub['Uso'] or ''}</div>
+                        <div class="location-meta">{ub['Ciudad'] if pd.notna(ub['Ciudad']) else ''} &middot; {ub['Uso'] if pd.notna(ub['Uso']) else ''}</div>
                     </div>
                     """, unsafe_allow_html=True)